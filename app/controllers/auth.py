@@ -1,17 +1,18 @@
 from fastapi import HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from jose import JWTError, jwt
 from .. import models, token, schemas
 from ..hashing import Hash
 from datetime import datetime, timedelta
-from ..models import BlacklistedToken
-from ..core import password
+from ..core import password, revocation
+from ..oauth2 import claims_cache
 FIXED_OTP = "1234"
 OTP_VALIDITY_MINUTES = 10
 
 def login(request: OAuth2PasswordRequestForm, db: Session):
-    user = db.query(models.User).filter(models.User.email == request.username).first()
+    user = models.by_email(db.query(models.User), request.username).first()
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail="Invalid Credentials")
@@ -31,7 +32,7 @@ def login(request: OAuth2PasswordRequestForm, db: Session):
 
 
 def signup(request: schemas.UserCreate, db: Session):
-    existing = db.query(models.User).filter(models.User.email == request.email).first()
+    existing = db.query(models.User).filter(models.User.email_normalized == models.normalize_email(request.email)).first()
     if existing:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                             detail="Email already registered")
@@ -48,7 +49,13 @@ def signup(request: schemas.UserCreate, db: Session):
         otp_expires=datetime.utcnow() + timedelta(minutes=OTP_VALIDITY_MINUTES)
     )
     db.add(new_user)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # a concurrent signup with the same address won the unique index
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Email already registered")
     db.refresh(new_user)
 
     return {
@@ -58,7 +65,7 @@ def signup(request: schemas.UserCreate, db: Session):
     }
 
 def change_password(user, request: schemas.ChangePasswordRequest, db: Session):
-    db_user = db.query(models.User).filter(models.User.email == user["email"]).first()
+    db_user = models.by_email(db.query(models.User), user["email"]).first()
     password.validate_password_strength(request.new_password)
     if not Hash.verify(db_user.password, request.old_password):
         raise HTTPException(status_code=400, detail="Old password is incorrect")
@@ -79,16 +86,15 @@ def refresh_token(request: schemas.TokenRefreshRequest):
         raise HTTPException(status_code=401, detail="Invalid refresh token")
 
 def logout(db, user, token):
-    blacklisted = BlacklistedToken(token=token)
-    db.add(blacklisted)
-    db.commit()
+    revocation.revoke(db, token, user)
+    claims_cache.pop(token)
     return {"message": "Logout successful"}
 
 def get_me(user, db):
-    return  db.query(models.User).filter(models.User.email == user["email"]).first()
+    return  models.by_email(db.query(models.User), user["email"]).first()
 
 def verify_email(request: schemas.VerifyRequest, db: Session):
-    user = db.query(models.User).filter(models.User.email == request.email).first()
+    user = models.by_email(db.query(models.User), request.email).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -124,7 +130,7 @@ def verify_email(request: schemas.VerifyRequest, db: Session):
 
 
 def resend_otp(request, db):
-    user = db.query(models.User).filter(models.User.email == request.email).first()
+    user = models.by_email(db.query(models.User), request.email).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
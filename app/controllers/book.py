@@ -1,13 +1,50 @@
+from fastapi import HTTPException, UploadFile
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app import models, schemas
+from app.core import catalog_io, reconcile, search, suggest
+from app.core.circulation import (
+    check_batch, loan_due_date, release_copy, release_copy_async, reserve_copies, reserve_copies_async,
+    reserve_copy, reserve_copy_async, shortfall_error, shortfall_error_async
+)
+from app.core.cache import book_cache
+from app.core.etag import catalog_version
+from app.core.pagination import decode_cursor, encode_cursor
+from app.core.isbn import normalize_isbn
 from datetime import datetime
 
+MAX_LOOKUP_ISBNS = 5000
+
+# Call after committing any write that touches a book row; None means "maybe all of them".
+def book_changed(book_id: int = None):
+    if book_id is None:
+        book_cache.clear()
+    else:
+        book_cache.pop(book_id)
+    catalog_version.bump(book_id)
+
+def _checked_isbn(raw: str, db: Session, book_id: int = None):
+    try:
+        isbn = normalize_isbn(raw)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if isbn is not None:
+        existing = db.query(models.Book.id).filter(models.Book.isbn == isbn).first()
+        if existing and existing.id != book_id:
+            raise HTTPException(status_code=400, detail="A book with this ISBN already exists")
+    return isbn
+
 # 1. Create a new book
 def create_book(request: schemas.CreateBookRequest, db: Session):
+    isbn = _checked_isbn(request.isbn, db)
+    if isbn is None:
+        raise HTTPException(status_code=400, detail="ISBN is required")
     book = models.Book(
         title=request.title,
         author=request.author,
-        isbn=request.isbn,
+        isbn=isbn,
         total_copies=request.total_copies,
         available_copies=request.total_copies,
         borrowed_copies=0
@@ -15,15 +52,132 @@ def create_book(request: schemas.CreateBookRequest, db: Session):
     db.add(book)
     db.commit()
     db.refresh(book)
+    book_changed(book.id)
+    suggest.index.add(book.id, book.title, book.author)
     return book
 
-# 2. Get all books
-def get_all_books(db: Session):
-    return db.query(models.Book).all()
+# Bulk import/upsert of a CSV or NDJSON catalog file, in batches
+def import_books(file: UploadFile, fmt: str, db: Session):
+    fmt = fmt or catalog_io.detect_format(file.filename, file.content_type)
+    if fmt not in catalog_io.IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Unsupported import format, use csv or ndjson")
+
+    aborted = False
+    try:
+        report = catalog_io.import_books(file.file, fmt, db)
+    except catalog_io.ImportAborted as e:
+        # batches before the bad line are committed, so caches still need refreshing
+        aborted, report = True, e.report
+
+    book_changed()
+    # one pass over the table is cheaper than indexing every upserted row
+    suggest.load_index(db)
+    if aborted:
+        raise HTTPException(status_code=400, detail=report)
+    return report
+
+# Full catalog dump; the generator owns the session until the last chunk is sent
+def export_books(fmt: str, db: Session):
+    if fmt not in catalog_io.EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Unsupported export format, use ndjson or csv")
+
+    def stream():
+        try:
+            yield from catalog_io.export_books(db, fmt)
+        finally:
+            db.close()
+
+    return stream()
+
+# 2. Get a page of books, keyset-paginated on id
+def _books_page_stmt(limit: int, after: int = None, author: str = None, available_only: bool = False):
+    stmt = select(models.Book)
+    if after is not None:
+        stmt = stmt.where(models.Book.id > after)
+    if author is not None:
+        stmt = stmt.where(models.Book.author == author)
+    if available_only:
+        stmt = stmt.where(models.Book.available_copies > 0)
+    # fetch one extra row to know whether another page exists
+    return stmt.order_by(models.Book.id).limit(limit + 1)
+
+def _books_page(books, limit: int):
+    next_cursor = books[limit - 1].id if len(books) > limit else None
+    return {"items": books[:limit], "next_cursor": next_cursor}
+
+def get_all_books(db: Session, limit: int, after: int = None, author: str = None, available_only: bool = False):
+    books = db.scalars(_books_page_stmt(limit, after, author, available_only)).all()
+    return _books_page(books, limit)
+
+async def get_all_books_async(db: AsyncSession, limit: int, after: int = None, author: str = None,
+                              available_only: bool = False):
+    books = (await db.scalars(_books_page_stmt(limit, after, author, available_only))).all()
+    return _books_page(books, limit)
 
-# 3. Get book by ID
+# Full-text search over title, author and isbn, best matches first
+def search_books(q: str, limit: int, offset: int, db: Session):
+    books = search.search(db, q, limit + 1, offset)
+    next_offset = offset + limit if len(books) > limit else None
+    return {"items": books[:limit], "next_offset": next_offset}
+
+# Type-ahead over titles and authors, served from the in-memory prefix index
+def suggest_books(prefix: str, limit: int):
+    return suggest.index.suggest(prefix, limit)
+
+# 3. Get book by ID, read through the book cache
 def get_book(book_id: int, db: Session):
-    return db.query(models.Book).filter(models.Book.id == book_id).first()
+    cached = book_cache.get(book_id)
+    if cached is not None:
+        return cached
+
+    return _cache_book(book_id, db.get(models.Book, book_id))
+
+async def get_book_async(book_id: int, db: AsyncSession):
+    cached = book_cache.get(book_id)
+    if cached is not None:
+        return cached
+
+    return _cache_book(book_id, await db.get(models.Book, book_id))
+
+def _cache_book(book_id: int, book):
+    if not book:
+        return None
+    data = {column.name: getattr(book, column.name) for column in models.Book.__table__.columns}
+    book_cache.set(book_id, data)
+    return data
+
+# Get book by ISBN-10/13, in any hyphenation
+def get_book_by_isbn(isbn: str, db: Session):
+    try:
+        isbn = normalize_isbn(isbn)
+    except ValueError:
+        return None
+    return db.query(models.Book).filter(models.Book.isbn == isbn).first()
+
+# Resolve a whole batch of scanned ISBNs with one IN query
+def lookup_books_by_isbn(isbns: list[str], db: Session):
+    if len(isbns) > MAX_LOOKUP_ISBNS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_LOOKUP_ISBNS} ISBNs per lookup")
+
+    normalized = {}
+    for raw in isbns:
+        try:
+            normalized[raw] = normalize_isbn(raw)
+        except ValueError:
+            normalized[raw] = None
+
+    wanted = {isbn for isbn in normalized.values() if isbn}
+    books = db.query(models.Book).filter(models.Book.isbn.in_(wanted)).all() if wanted else []
+    by_isbn = {b.isbn: b for b in books}
+
+    found = {}
+    missing = []
+    for raw, isbn in normalized.items():
+        if isbn in by_isbn:
+            found[raw] = by_isbn[isbn]
+        else:
+            missing.append(raw)
+    return {"found": found, "missing": missing}
 
 # 4. Update book
 def update_book(book_id: int, request: schemas.BookUpdateRequest, db: Session):
@@ -38,7 +192,7 @@ def update_book(book_id: int, request: schemas.BookUpdateRequest, db: Session):
     if request.author is not None:
         book.author = request.author
     if request.isbn is not None:
-        book.isbn = request.isbn
+        book.isbn = _checked_isbn(request.isbn, db, book_id)
     if request.total_copies is not None:
         diff = request.total_copies - book.total_copies
         book.total_copies = request.total_copies
@@ -49,6 +203,8 @@ def update_book(book_id: int, request: schemas.BookUpdateRequest, db: Session):
 
     db.commit()
     db.refresh(book)
+    book_changed(book_id)
+    suggest.index.add(book.id, book.title, book.author)
     return book
 
 # 5. Delete book
@@ -56,50 +212,179 @@ def delete_book(book_id: int, db: Session):
     book = db.query(models.Book).filter(models.Book.id == book_id).first()
     if not book:
         return False
+    # the loans ledger keeps its book; a title with any loans on record stays
+    if db.query(models.Loan.id).filter(models.Loan.book_id == book_id).first():
+        raise HTTPException(status_code=409, detail="Book has loans on record and can't be deleted")
 
     db.delete(book)
     db.commit()
+    book_changed(book_id)
+    suggest.index.remove(book_id)
     return True
 
+# Recompute copy counters from open loans; full=False only checks books changed since the last run
+def reconcile_counters(full: bool, db: Session):
+    report = reconcile.reconcile_counters(db, full)
+    for drift in report["drifted"]:
+        book_changed(drift["book_id"])
+    return report
+
 ## borrow related controllers
 
+def _new_borrow(user: dict, book_id: int, due_date: datetime = None):
+    return models.Loan(
+        user_id=user["id"],
+        book_id=book_id,
+        channel=schemas.LoanChannel.borrow.value,
+        due_date=due_date or loan_due_date()
+    )
+
 def borrow_book(user: dict, request: schemas.BorrowRequest, db: Session):
     try:
-        book = db.query(models.Book).filter(models.Book.id == request.book_id).first()
-        if not book or book.available_copies <= 0:
-            return None
-
-        book.borrowed_copies += 1
-        book.available_copies -= 1
+        # take a copy in one conditional UPDATE; only look closer if that failed
+        if not reserve_copy(db, request.book_id):
+            db.rollback()
+            if not db.query(models.Book.id).filter(models.Book.id == request.book_id).first():
+                raise HTTPException(status_code=404, detail="Book not found")
+            raise HTTPException(status_code=400, detail="No available copies")
 
-        borrow = models.Borrow(
-            user_id=user["id"],
-            book_id=request.book_id
-        )
+        borrow = _new_borrow(user, request.book_id)
         db.add(borrow)
         db.commit()
         db.refresh(borrow)
+        book_changed(request.book_id)
         return borrow
 
     except Exception as e:
         print("ERROR IN BORROW BOOK:", e)
         raise
 
+async def borrow_book_async(user: dict, request: schemas.BorrowRequest, db: AsyncSession):
+    if not await reserve_copy_async(db, request.book_id):
+        await db.rollback()
+        if await db.scalar(select(models.Book.id).where(models.Book.id == request.book_id)) is None:
+            raise HTTPException(status_code=404, detail="Book not found")
+        raise HTTPException(status_code=400, detail="No available copies")
+
+    borrow = _new_borrow(user, request.book_id)
+    db.add(borrow)
+    await db.commit()
+    await db.refresh(borrow)
+    book_changed(request.book_id)
+    return borrow
+
+
+# Borrow several books at once: one reservation statement, one insert batch, one commit
+def borrow_books_batch(user: dict, request: schemas.BorrowBatchRequest, db: Session):
+    check_batch(request.book_ids)
+    short = reserve_copies(db, request.book_ids)
+    if short:
+        raise shortfall_error(db, short)
+
+    due_date = loan_due_date()
+    borrows = [_new_borrow(user, book_id, due_date) for book_id in request.book_ids]
+    db.add_all(borrows)
+    db.flush()
+    borrow_ids = [b.id for b in borrows]
+    db.commit()
+
+    for book_id in set(request.book_ids):
+        book_changed(book_id)
+    return db.scalars(_loans_stmt(borrow_ids)).all()
+
+async def borrow_books_batch_async(user: dict, request: schemas.BorrowBatchRequest, db: AsyncSession):
+    check_batch(request.book_ids)
+    short = await reserve_copies_async(db, request.book_ids)
+    if short:
+        raise await shortfall_error_async(db, short)
+
+    due_date = loan_due_date()
+    borrows = [_new_borrow(user, book_id, due_date) for book_id in request.book_ids]
+    db.add_all(borrows)
+    await db.flush()
+    borrow_ids = [b.id for b in borrows]
+    await db.commit()
+
+    for book_id in set(request.book_ids):
+        book_changed(book_id)
+    return (await db.scalars(_loans_stmt(borrow_ids))).all()
+
+def _loans_stmt(loan_ids: list[int]):
+    return select(models.Loan).where(models.Loan.id.in_(loan_ids)).order_by(models.Loan.id)
+
 
 def return_book(borrow_id: int, user: dict, db: Session):
-    borrow = db.query(models.Borrow).filter(models.Borrow.id == borrow_id).first()
+    borrow = db.query(models.Loan).filter(models.Loan.id == borrow_id).first()
     if not borrow or borrow.user_id != user["id"] or borrow.return_date is not None:
         return None
 
-    borrow.return_date = datetime.utcnow()
-
-    book = db.query(models.Book).filter(models.Book.id == borrow.book_id).first()
-    book.available_copies += 1
-    book.borrowed_copies -= 1
+    # conditional close so two concurrent returns can't both release a copy
+    if not db.execute(_close_loan_stmt(borrow_id)).rowcount:
+        db.rollback()
+        return None
+    release_copy(db, borrow.book_id)
 
     db.commit()
     db.refresh(borrow)
+    book_changed(borrow.book_id)
     return borrow
 
-def get_borrow_history(book_id: int, db: Session):
-    return db.query(models.Borrow).filter(models.Borrow.book_id == book_id).all()
+async def return_book_async(borrow_id: int, user: dict, db: AsyncSession):
+    borrow = await db.get(models.Loan, borrow_id)
+    if not borrow or borrow.user_id != user["id"] or borrow.return_date is not None:
+        return None
+
+    if not (await db.execute(_close_loan_stmt(borrow_id))).rowcount:
+        await db.rollback()
+        return None
+    await release_copy_async(db, borrow.book_id)
+
+    await db.commit()
+    await db.refresh(borrow)
+    book_changed(borrow.book_id)
+    return borrow
+
+def _close_loan_stmt(loan_id: int):
+    return (
+        update(models.Loan)
+        .where(models.Loan.id == loan_id, models.Loan.return_date.is_(None))
+        .values(return_date=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+# Newest-first loan history of a book across both channels, keyset-paginated
+# on (loan_date, id) so every page is a bounded walk of ix_loans_book_id_loan_date
+def _history_stmt(book_id: int, limit: int, cursor: str = None,
+                  since: datetime = None, until: datetime = None, channel: schemas.LoanChannel = None):
+    stmt = select(models.Loan).where(models.Loan.book_id == book_id)
+    if channel is not None:
+        stmt = stmt.where(models.Loan.channel == channel.value)
+    if since is not None:
+        stmt = stmt.where(models.Loan.loan_date >= since)
+    if until is not None:
+        stmt = stmt.where(models.Loan.loan_date < until)
+    if cursor is not None:
+        last_date, last_id = decode_cursor(cursor)
+        stmt = stmt.where(or_(
+            models.Loan.loan_date < last_date,
+            and_(models.Loan.loan_date == last_date, models.Loan.id < last_id),
+        ))
+    return stmt.order_by(models.Loan.loan_date.desc(), models.Loan.id.desc()).limit(limit + 1)
+
+def get_borrow_history(book_id: int, db: Session, limit: int, cursor: str = None,
+                       since: datetime = None, until: datetime = None, channel: schemas.LoanChannel = None):
+    borrows = db.scalars(_history_stmt(book_id, limit, cursor, since, until, channel)).all()
+    return _history_page(borrows, limit)
+
+async def get_borrow_history_async(book_id: int, db: AsyncSession, limit: int, cursor: str = None,
+                                   since: datetime = None, until: datetime = None,
+                                   channel: schemas.LoanChannel = None):
+    borrows = (await db.scalars(_history_stmt(book_id, limit, cursor, since, until, channel))).all()
+    return _history_page(borrows, limit)
+
+def _history_page(borrows, limit: int):
+    next_cursor = None
+    if len(borrows) > limit:
+        last = borrows[limit - 1]
+        next_cursor = encode_cursor(last.loan_date, last.id)
+    return {"items": borrows[:limit], "next_cursor": next_cursor}
@@ -1,48 +1,157 @@
 from fastapi import HTTPException
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from datetime import datetime
 from sqlalchemy.orm import joinedload
-from ..models import IssuedBook
+from ..models import Loan
 from ..models import Book
 from ..models import User
-from ..schemas import IssueCreate
+from ..schemas import IssueBatchCreate, IssueCreate, IssueStatus, LoanChannel
+from ..core.circulation import (
+    check_batch, loan_due_date, overdue_query, overdue_select, release_copy, release_copy_async,
+    reserve_copies, reserve_copies_async, reserve_copy, reserve_copy_async, shortfall_error, shortfall_error_async
+)
+from ..core.pagination import decode_cursor, encode_cursor
+from .book import book_changed
 
 def issue_book(db: Session, issue_data: IssueCreate):
-    # check if book exists
-    book = db.query(Book).filter(Book.id == issue_data.book_id).first()
-    if not book:
-        raise HTTPException(status_code=404, detail="Book not found")
-
-    # check availability
-    if book.available_copies < 1:
-        raise HTTPException(status_code=400, detail="No available copies")
-
     # check if member exists
-    member = db.query(User).filter(User.id == issue_data.user_id).first()
+    member = db.query(User.id).filter(User.id == issue_data.user_id).first()
     if not member:
         raise HTTPException(status_code=404, detail="User not found")
 
+    # take a copy in one conditional UPDATE; only look closer if that failed
+    if not reserve_copy(db, issue_data.book_id):
+        db.rollback()
+        if not db.query(Book.id).filter(Book.id == issue_data.book_id).first():
+            raise HTTPException(status_code=404, detail="Book not found")
+        raise HTTPException(status_code=400, detail="No available copies")
+
     # create issue entry
-    issue = IssuedBook(
+    issue = Loan(
         user_id=issue_data.user_id,
-        book_id=issue_data.book_id
+        book_id=issue_data.book_id,
+        channel=LoanChannel.issue.value,
+        due_date=loan_due_date()
     )
 
-    book.available_copies -= 1
-
     db.add(issue)
     db.commit()
     db.refresh(issue)
+    book_changed(issue.book_id)
     return issue
 
+# Loans with the member and book they point at, re-read after a commit:
+# the copy counters were moved by UPDATEs the session never saw.
+def _loans_with_refs(loan_ids: list[int]):
+    return (
+        select(Loan)
+        .options(joinedload(Loan.user), joinedload(Loan.book))
+        .where(Loan.id.in_(loan_ids))
+        .order_by(Loan.id)
+        .execution_options(populate_existing=True)
+    )
+
+async def issue_book_async(db: AsyncSession, issue_data: IssueCreate):
+    if await db.scalar(select(User.id).where(User.id == issue_data.user_id)) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    if not await reserve_copy_async(db, issue_data.book_id):
+        await db.rollback()
+        if await db.scalar(select(Book.id).where(Book.id == issue_data.book_id)) is None:
+            raise HTTPException(status_code=404, detail="Book not found")
+        raise HTTPException(status_code=400, detail="No available copies")
+
+    issue = Loan(
+        user_id=issue_data.user_id,
+        book_id=issue_data.book_id,
+        channel=LoanChannel.issue.value,
+        due_date=loan_due_date()
+    )
+    db.add(issue)
+    await db.flush()
+    issue_id = issue.id
+    await db.commit()
+
+    book_changed(issue_data.book_id)
+    return (await db.scalars(_loans_with_refs([issue_id]))).one()
+
+def issue_books_batch(db: Session, batch: IssueBatchCreate):
+    check_batch(batch.book_ids)
+
+    # validate the member once for the whole checkout
+    member = db.query(User.id).filter(User.id == batch.user_id).first()
+    if not member:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    short = reserve_copies(db, batch.book_ids)
+    if short:
+        raise shortfall_error(db, short)
+
+    due_date = loan_due_date()
+    issues = [
+        Loan(user_id=batch.user_id, book_id=book_id, channel=LoanChannel.issue.value, due_date=due_date)
+        for book_id in batch.book_ids
+    ]
+    db.add_all(issues)
+    db.flush()
+    issue_ids = [i.id for i in issues]
+    db.commit()
+
+    for book_id in set(batch.book_ids):
+        book_changed(book_id)
+    return (
+        db.query(Loan)
+        .options(
+            joinedload(Loan.user),
+            joinedload(Loan.book)
+        )
+        .filter(Loan.id.in_(issue_ids))
+        .order_by(Loan.id)
+        .all()
+    )
+
+async def issue_books_batch_async(db: AsyncSession, batch: IssueBatchCreate):
+    check_batch(batch.book_ids)
+
+    if await db.scalar(select(User.id).where(User.id == batch.user_id)) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    short = await reserve_copies_async(db, batch.book_ids)
+    if short:
+        raise await shortfall_error_async(db, short)
+
+    due_date = loan_due_date()
+    issues = [
+        Loan(user_id=batch.user_id, book_id=book_id, channel=LoanChannel.issue.value, due_date=due_date)
+        for book_id in batch.book_ids
+    ]
+    db.add_all(issues)
+    await db.flush()
+    issue_ids = [i.id for i in issues]
+    await db.commit()
+
+    for book_id in set(batch.book_ids):
+        book_changed(book_id)
+    return (await db.scalars(_loans_with_refs(issue_ids))).all()
+
+def _close_loan_stmt(issue_id: int):
+    return (
+        update(Loan)
+        .where(Loan.id == issue_id, Loan.return_date.is_(None))
+        .values(return_date=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
 def return_book(db: Session, issue_id: int):
     issue = (
-        db.query(IssuedBook)
+        db.query(Loan)
         .options(
-            joinedload(IssuedBook.user),
-            joinedload(IssuedBook.book)
+            joinedload(Loan.user),
+            joinedload(Loan.book)
         )
-        .filter(IssuedBook.id == issue_id)
+        .filter(Loan.id == issue_id)
         .first()
     )
 
@@ -51,22 +160,105 @@ def return_book(db: Session, issue_id: int):
     if issue.return_date is not None:
         raise HTTPException(status_code=400, detail="Book already returned")
 
-    issue.return_date = datetime.utcnow()
-
-    issue.book.available_copies += 1  # already loaded via joinedload
+    if not db.execute(_close_loan_stmt(issue_id)).rowcount:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Book already returned")
+    release_copy(db, issue.book_id)
 
     db.commit()
     db.refresh(issue)
+    book_changed(issue.book_id)
     return issue
 
+async def return_book_async(db: AsyncSession, issue_id: int):
+    loan = (await db.execute(select(Loan.book_id, Loan.return_date).where(Loan.id == issue_id))).first()
+    if not loan:
+        raise HTTPException(status_code=404, detail="Issue record not found")
+    book_id, return_date = loan
+    if return_date is not None:
+        raise HTTPException(status_code=400, detail="Book already returned")
+
+    if not (await db.execute(_close_loan_stmt(issue_id))).rowcount:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Book already returned")
+    await release_copy_async(db, book_id)
+    await db.commit()
+
+    book_changed(book_id)
+    return (await db.scalars(_loans_with_refs([issue_id]))).one()
+
 
-def get_all_issued_books(db: Session):
-    issued_books = (
-        db.query(IssuedBook)
+def _issued_books_stmt(status: IssueStatus, limit: int, after: int = None,
+                       user_id: int = None, book_id: int = None, channel: LoanChannel = None):
+    # every loan on the ledger, whichever desk or self-service path made it
+    stmt = select(Loan)
+    # "return_date IS NULL" must appear literally for SQLite to pick the partial indexes
+    if status == IssueStatus.active:
+        stmt = stmt.where(Loan.return_date.is_(None))
+    elif status == IssueStatus.returned:
+        stmt = stmt.where(Loan.return_date.isnot(None))
+    if user_id is not None:
+        stmt = stmt.where(Loan.user_id == user_id)
+    if book_id is not None:
+        stmt = stmt.where(Loan.book_id == book_id)
+    if channel is not None:
+        stmt = stmt.where(Loan.channel == channel.value)
+    if after is not None:
+        stmt = stmt.where(Loan.id > after)
+
+    return (
+        stmt.options(
+            joinedload(Loan.user),  # eager load User
+            joinedload(Loan.book)   # eager load Book
+        )
+        .order_by(Loan.id)
+        .limit(limit + 1)
+    )
+
+def _issued_books_page(issued_books, limit: int):
+    next_cursor = issued_books[limit - 1].id if len(issued_books) > limit else None
+    return {"items": issued_books[:limit], "next_cursor": next_cursor}
+
+
+def get_all_issued_books(db: Session, status: IssueStatus, limit: int, after: int = None,
+                         user_id: int = None, book_id: int = None, channel: LoanChannel = None):
+    issued_books = db.scalars(_issued_books_stmt(status, limit, after, user_id, book_id, channel)).all()
+    return _issued_books_page(issued_books, limit)
+
+
+async def get_all_issued_books_async(db: AsyncSession, status: IssueStatus, limit: int, after: int = None,
+                                     user_id: int = None, book_id: int = None, channel: LoanChannel = None):
+    issued_books = (await db.scalars(_issued_books_stmt(status, limit, after, user_id, book_id, channel))).all()
+    return _issued_books_page(issued_books, limit)
+
+
+def get_overdue_books(db: Session, limit: int, cursor: str = None):
+    after = decode_cursor(cursor) if cursor is not None else None
+    overdue = (
+        overdue_query(db, datetime.utcnow(), after)
         .options(
-            joinedload(IssuedBook.user),  # eager load User
-            joinedload(IssuedBook.book)   # eager load Book
+            joinedload(Loan.user),
+            joinedload(Loan.book)
         )
+        .limit(limit + 1)
         .all()
     )
-    return issued_books
+    return _overdue_page(overdue, limit)
+
+
+async def get_overdue_books_async(db: AsyncSession, limit: int, cursor: str = None):
+    after = decode_cursor(cursor) if cursor is not None else None
+    stmt = (
+        overdue_select(datetime.utcnow(), after)
+        .options(joinedload(Loan.user), joinedload(Loan.book))
+        .limit(limit + 1)
+    )
+    return _overdue_page((await db.scalars(stmt)).all(), limit)
+
+
+def _overdue_page(overdue, limit: int):
+    next_cursor = None
+    if len(overdue) > limit:
+        last = overdue[limit - 1]
+        next_cursor = encode_cursor(last.due_date, last.id)
+    return {"items": overdue[:limit], "next_cursor": next_cursor}
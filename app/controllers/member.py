@@ -1,19 +1,28 @@
 from fastapi import Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app import models, schemas, database
 # from app.auth.role_check import role_required
 # from ..core.rbac import role_required
 # from typing import List
 
+LOANS_ON_RECORD = "Member has loans on record and can't be deleted"
+
 
 # Get all members (users)
 def get_all_members(db: Session):
     return db.query(models.User).all()
 
 
+async def get_all_members_async(db: AsyncSession):
+    return (await db.scalars(select(models.User))).all()
+
+
 # Create a new member
 def create_member(user: schemas.UserCreate, db: Session):
-    existing = db.query(models.User).filter(models.User.email == user.email).first()
+    existing = db.query(models.User).filter(models.User.email_normalized == models.normalize_email(user.email)).first()
     if existing:
         raise HTTPException(status_code=400, detail="Email already exists")
 
@@ -24,11 +33,36 @@ def create_member(user: schemas.UserCreate, db: Session):
         role="member"
     )
     db.add(new_user)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Email already exists")
     db.refresh(new_user)
     return new_user
 
 
+async def create_member_async(user: schemas.UserCreate, db: AsyncSession):
+    existing = await db.scalar(select(models.User.id).where(models.User.email_normalized == models.normalize_email(user.email)))
+    if existing is not None:
+        raise HTTPException(status_code=400, detail="Email already exists")
+
+    new_user = models.User(
+        email=user.email,
+        name=user.name,
+        password=user.password,
+        role="member"
+    )
+    db.add(new_user)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Email already exists")
+    await db.refresh(new_user)
+    return new_user
+
+
 # Update a member
 def update_member(member_id: int, user: schemas.UserUpdate, db: Session):
     member = db.query(models.User).filter(models.User.id == member_id).first()
@@ -42,17 +76,57 @@ def update_member(member_id: int, user: schemas.UserUpdate, db: Session):
     if user.password is not None:
         member.password = user.password  # Again, hash this in real-world apps
 
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Email already exists")
     db.refresh(member)
     return member
 
 
+async def update_member_async(member_id: int, user: schemas.UserUpdate, db: AsyncSession):
+    member = await db.get(models.User, member_id)
+    if not member:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    if user.name is not None:
+        member.name = user.name
+    if user.email is not None:
+        member.email = user.email
+    if user.password is not None:
+        member.password = user.password
+
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Email already exists")
+    await db.refresh(member)
+    return member
+
+
 # Delete a member
 def delete_member(member_id: int, db: Session):
     member = db.query(models.User).filter(models.User.id == member_id).first()
     if not member:
         raise HTTPException(status_code=404, detail="User not found")
+    # the loans ledger keeps its member; anyone with loans on record stays
+    if db.query(models.Loan.id).filter(models.Loan.user_id == member_id).first():
+        raise HTTPException(status_code=409, detail=LOANS_ON_RECORD)
 
     db.delete(member)
     db.commit()
     return {"detail": "Member deleted"}
+
+
+async def delete_member_async(member_id: int, db: AsyncSession):
+    member = await db.get(models.User, member_id)
+    if not member:
+        raise HTTPException(status_code=404, detail="User not found")
+    if await db.scalar(select(models.Loan.id).where(models.Loan.user_id == member_id).limit(1)) is not None:
+        raise HTTPException(status_code=409, detail=LOANS_ON_RECORD)
+
+    await db.delete(member)
+    await db.commit()
+    return {"detail": "Member deleted"}
@@ -1,4 +1,5 @@
 
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from .. import models, schemas
 from fastapi import HTTPException, status
@@ -9,7 +10,11 @@ def create(request: schemas.User, db: Session):
     new_user = models.User(
         name=request.name, email=request.email, password=Hash.bcrypt(request.password))
     db.add(new_user)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
     db.refresh(new_user)
     return new_user
 
@@ -22,7 +27,7 @@ def show(id: int, db: Session):
     return user
 
 def update_user(user, request: schemas.UserUpdate, db: Session):
-    db_user = db.query(models.User).filter(models.User.email == user["email"]).first()
+    db_user = models.by_email(db.query(models.User), user["email"]).first()
     if request.email:
         db_user.email = request.email
     if request.username:
@@ -33,5 +38,9 @@ def update_user(user, request: schemas.UserUpdate, db: Session):
         db_user.password = Hash.bcrypt(request.password)
     if request.name :
         db_user.name = request.name
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
     return {"message": "User updated"}
\ No newline at end of file
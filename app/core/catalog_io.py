@@ -0,0 +1,221 @@
+import csv
+import io
+import json
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.core.isbn import normalize_isbn
+from app.models import Book
+
+IMPORT_FORMATS = ("csv", "ndjson")
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FIELDS = ("id", "title", "author", "isbn", "total_copies", "borrowed_copies", "available_copies")
+
+# Rows sharing an ISBN with an existing book update it in place; the copy
+# counters move by the change in total_copies so open loans stay accounted for.
+_UPSERT_SQL = text("""
+    INSERT INTO books (title, author, isbn, total_copies, borrowed_copies, available_copies, updated_at)
+    VALUES (:title, :author, :isbn, :total_copies, 0, :total_copies, strftime('%Y-%m-%d %H:%M:%f', 'now') || '000')
+    ON CONFLICT (isbn) DO UPDATE SET
+        title = excluded.title,
+        author = excluded.author,
+        available_copies = MAX(books.available_copies + excluded.total_copies - books.total_copies, 0),
+        total_copies = excluded.total_copies,
+        updated_at = excluded.updated_at
+""")
+
+
+def detect_format(filename: str, content_type: str):
+    name = (filename or "").lower()
+    if name.endswith(".csv") or content_type == "text/csv":
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")) or content_type in ("application/x-ndjson", "application/jsonl"):
+        return "ndjson"
+    return None
+
+
+class ImportAborted(ValueError):
+    # The rest of the file can't be read. Rows before `line` have been
+    # imported; import_books attaches the report of what got written.
+    def __init__(self, line: int, message: str):
+        super().__init__(message)
+        self.line = line
+        self.report = None
+
+
+def _csv_lines(stream):
+    # Decoded a line at a time so a bad byte is pinned to its line instead of
+    # surfacing from whichever 8KB chunk a TextIOWrapper happened to read.
+    for line_no, line in enumerate(stream, start=1):
+        try:
+            yield line.decode("utf-8")
+        except UnicodeDecodeError:
+            raise ImportAborted(line_no, "File is not valid UTF-8")
+
+
+def iter_records(stream, fmt: str):
+    # Yields (line number, record or error) one row at a time from a binary stream.
+    if fmt == "csv":
+        rows = csv.DictReader(_csv_lines(stream))
+        try:
+            for row in rows:
+                yield rows.line_num, row
+        except csv.Error as e:
+            raise ImportAborted(rows.line_num, f"Invalid CSV: {e}")
+        return
+
+    for line_no, line in enumerate(stream, start=1):
+        try:
+            line = line.decode("utf-8")
+        except UnicodeDecodeError:
+            yield line_no, ValueError("Line is not valid UTF-8")
+            continue
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_no, ValueError(f"Invalid JSON: {e}")
+            continue
+        if not isinstance(record, dict):
+            yield line_no, ValueError("Expected a JSON object")
+            continue
+        yield line_no, record
+
+
+def _text(record: dict, field: str):
+    value = record.get(field)
+    if value is None:
+        return ""
+    if not isinstance(value, str):
+        raise ValueError(f"{field} must be a string")
+    return value.strip()
+
+
+def _copies(value):
+    if value is None or value == "":
+        return 1
+    # bool is an int subclass, and a float only counts if it is whole
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    raise ValueError("total_copies must be an integer")
+
+
+def clean_record(record: dict):
+    title = _text(record, "title")
+    author = _text(record, "author")
+    if not title:
+        raise ValueError("title is required")
+    if not author:
+        raise ValueError("author is required")
+
+    total_copies = _copies(record.get("total_copies"))
+    if total_copies < 0:
+        raise ValueError("total_copies must not be negative")
+
+    isbn = _text(record, "isbn")
+    return {
+        "title": title,
+        "author": author,
+        "isbn": normalize_isbn(isbn) if isbn else None,
+        "total_copies": total_copies,
+    }
+
+
+def _write_batch(db: Session, batch, report):
+    try:
+        db.execute(_UPSERT_SQL, [row for _, row in batch])
+        db.commit()
+        report["imported"] += len(batch)
+        return
+    except Exception:
+        db.rollback()
+
+    # Something in the batch violates a constraint; retry row by row to find it.
+    for line_no, row in batch:
+        try:
+            db.execute(_UPSERT_SQL, row)
+            db.commit()
+            report["imported"] += 1
+        except Exception as e:
+            db.rollback()
+            _record_error(report, line_no, str(getattr(e, "orig", e)))
+
+
+def _record_error(report, line_no: int, message: str):
+    report["failed"] += 1
+    if len(report["errors"]) < MAX_REPORTED_ERRORS:
+        report["errors"].append({"line": line_no, "error": message})
+
+
+def import_books(stream, fmt: str, db: Session):
+    report = {"imported": 0, "failed": 0, "errors": []}
+    batch = []
+    try:
+        for line_no, record in iter_records(stream, fmt):
+            try:
+                if isinstance(record, Exception):
+                    raise record
+                batch.append((line_no, clean_record(record)))
+            except ValueError as e:
+                _record_error(report, line_no, str(e))
+                continue
+
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                _write_batch(db, batch, report)
+                batch = []
+    except ImportAborted as e:
+        # keep the rows read so far, so the report covers everything before the bad line
+        if batch:
+            _write_batch(db, batch, report)
+        _record_error(report, e.line, str(e))
+        e.report = report
+        raise
+
+    if batch:
+        _write_batch(db, batch, report)
+    return report
+
+
+def export_books(db: Session, fmt: str):
+    # Rows come off a streaming cursor EXPORT_BATCH_SIZE at a time and each
+    # batch is encoded into one chunk, so memory stays flat however big the
+    # catalog is. Plain column tuples skip ORM identity-map bookkeeping.
+    rows = (
+        db.query(*(getattr(Book, field) for field in EXPORT_FIELDS))
+        .order_by(Book.id)
+        .execution_options(stream_results=True)
+        .yield_per(EXPORT_BATCH_SIZE)
+    )
+
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_FIELDS)
+        for i, row in enumerate(rows, start=1):
+            writer.writerow(row)
+            if i % EXPORT_BATCH_SIZE == 0:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue().encode()
+        return
+
+    chunk = []
+    for row in rows:
+        chunk.append(json.dumps(dict(zip(EXPORT_FIELDS, row))))
+        if len(chunk) >= EXPORT_BATCH_SIZE:
+            yield ("\n".join(chunk) + "\n").encode()
+            chunk = []
+    if chunk:
+        yield ("\n".join(chunk) + "\n").encode()
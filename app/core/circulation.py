@@ -0,0 +1,179 @@
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from sqlalchemy import and_, case, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.models import Book, Loan
+
+# Copy counters are only ever changed with single conditional UPDATEs so the
+# check and the write happen atomically inside the database. Reading the row,
+# testing available_copies in Python and writing it back lets two concurrent
+# borrowers both see the last copy and oversell it.
+
+# Largest checkout a single batch request may take in one transaction.
+MAX_BATCH_BOOKS = 50
+
+LOAN_PERIOD_DAYS = int(os.getenv("LOAN_PERIOD_DAYS", "14"))
+SWEEP_CHUNK_SIZE = 1000
+
+
+def loan_due_date(start: datetime = None) -> datetime:
+    return (start or datetime.utcnow()) + timedelta(days=LOAN_PERIOD_DAYS)
+
+
+# Statements shared by the sync helpers below and their async twins.
+def _reserve_copy_stmt(book_id: int):
+    return (
+        update(Book)
+        .where(Book.id == book_id, Book.available_copies > 0)
+        .values(available_copies=Book.available_copies - 1, borrowed_copies=Book.borrowed_copies + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _release_copy_stmt(book_id: int):
+    return (
+        update(Book)
+        .where(Book.id == book_id)
+        .values(available_copies=Book.available_copies + 1, borrowed_copies=Book.borrowed_copies - 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _reserve_copies_stmts(book_ids: list[int]):
+    # One UPDATE that takes every requested copy (a title may appear more
+    # than once), and the query that finds which titles could be satisfied.
+    wanted = Counter(book_ids)
+    needed = case(dict(wanted), value=Book.id)
+    enough = (Book.id.in_(wanted), Book.available_copies >= needed)
+    reserve = (
+        update(Book)
+        .where(*enough)
+        .values(available_copies=Book.available_copies - needed, borrowed_copies=Book.borrowed_copies + needed)
+        .execution_options(synchronize_session=False)
+    )
+    return wanted, reserve, select(Book.id).where(*enough)
+
+
+def reserve_copy(db: Session, book_id: int) -> bool:
+    return db.execute(_reserve_copy_stmt(book_id)).rowcount == 1
+
+
+def release_copy(db: Session, book_id: int):
+    db.execute(_release_copy_stmt(book_id))
+
+
+def reserve_copies(db: Session, book_ids: list[int]) -> list[int]:
+    # Set-based version of reserve_copy for a whole checkout. If any title
+    # falls short the transaction is rolled back and the short ids returned.
+    wanted, reserve, satisfiable = _reserve_copies_stmts(book_ids)
+    if db.execute(reserve).rowcount == len(wanted):
+        return []
+
+    db.rollback()
+    satisfied = set(db.scalars(satisfiable))
+    return sorted(set(wanted) - satisfied)
+
+
+async def reserve_copy_async(db: AsyncSession, book_id: int) -> bool:
+    return (await db.execute(_reserve_copy_stmt(book_id))).rowcount == 1
+
+
+async def release_copy_async(db: AsyncSession, book_id: int):
+    await db.execute(_release_copy_stmt(book_id))
+
+
+async def reserve_copies_async(db: AsyncSession, book_ids: list[int]) -> list[int]:
+    wanted, reserve, satisfiable = _reserve_copies_stmts(book_ids)
+    if (await db.execute(reserve)).rowcount == len(wanted):
+        return []
+
+    await db.rollback()
+    satisfied = set(await db.scalars(satisfiable))
+    return sorted(set(wanted) - satisfied)
+
+
+def check_batch(book_ids: list[int]):
+    if not book_ids:
+        raise HTTPException(status_code=400, detail="No books given")
+    if len(book_ids) > MAX_BATCH_BOOKS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_BOOKS} books per batch")
+
+
+def _shortfall_error(short_ids: list[int], existing: set) -> HTTPException:
+    missing = [book_id for book_id in short_ids if book_id not in existing]
+    if missing:
+        return HTTPException(status_code=404, detail=f"Books not found: {missing}")
+    return HTTPException(status_code=400, detail=f"No available copies for books: {short_ids}")
+
+
+def shortfall_error(db: Session, short_ids: list[int]) -> HTTPException:
+    return _shortfall_error(short_ids, set(db.scalars(select(Book.id).where(Book.id.in_(short_ids)))))
+
+
+async def shortfall_error_async(db: AsyncSession, short_ids: list[int]) -> HTTPException:
+    return _shortfall_error(short_ids, set(await db.scalars(select(Book.id).where(Book.id.in_(short_ids)))))
+
+
+def _overdue_conditions(now: datetime, after=None):
+    # Open loans past due. The literal "return_date IS NULL" lets SQLite
+    # answer this from the partial (due_date) index as a single range scan.
+    conditions = [Loan.return_date.is_(None), Loan.due_date < now]
+    if after is not None:
+        last_due, last_id = after
+        conditions.append(or_(
+            Loan.due_date > last_due,
+            and_(Loan.due_date == last_due, Loan.id > last_id),
+        ))
+    return conditions
+
+
+def overdue_query(db: Session, now: datetime, after=None):
+    # oldest due date first
+    return db.query(Loan).filter(*_overdue_conditions(now, after)).order_by(Loan.due_date, Loan.id)
+
+
+def overdue_select(now: datetime, after=None):
+    return select(Loan).where(*_overdue_conditions(now, after)).order_by(Loan.due_date, Loan.id)
+
+
+def iter_overdue_chunks(db: Session, now: datetime, chunk_size: int = SWEEP_CHUNK_SIZE):
+    # Plain (id, user_id, book_id, channel, due_date) rows, chunk by chunk; each chunk
+    # resumes the index walk where the previous one stopped, so the handler is
+    # free to write and commit between chunks.
+    after = None
+    while True:
+        chunk = (
+            overdue_query(db, now, after)
+            .with_entities(Loan.id, Loan.user_id, Loan.book_id, Loan.channel, Loan.due_date)
+            .limit(chunk_size)
+            .all()
+        )
+        if not chunk:
+            return
+        yield chunk
+        after = (chunk[-1].due_date, chunk[-1].id)
+
+
+def sweep_overdue(db: Session, handler=None, now: datetime = None, chunk_size: int = SWEEP_CHUNK_SIZE):
+    # Batch entry point for overdue processing: walks every overdue loan once,
+    # whatever its channel, and hands each chunk to handler(rows). Reports
+    # the count per channel.
+    now = now or datetime.utcnow()
+    report = {}
+    for chunk in iter_overdue_chunks(db, now, chunk_size):
+        if handler is not None:
+            handler(chunk)
+        for row in chunk:
+            report[row.channel] = report.get(row.channel, 0) + 1
+    return report
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    with SessionLocal() as session:
+        for channel, count in sweep_overdue(session).items():
+            print(f"{channel}: {count} overdue")
@@ -0,0 +1,64 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from fastapi import Request
+
+# The counters only see writes made through this process. Other workers and
+# the maintenance CLIs change rows without bumping them, so every tag also
+# carries the current time window: a stale tag stops matching within this
+# many seconds, the same bound the book cache's TTL puts on stale bodies.
+ETAG_MAX_AGE_SECONDS = float(os.getenv("ETAG_MAX_AGE_SECONDS", "60"))
+
+
+class CatalogVersion:
+    # In-process version counters for the catalog. Every mutating controller
+    # bumps them after commit; ETags are derived from the counters, so a
+    # conditional GET can be answered without touching the database.
+    # The boot id keeps tags from one process (or run) from ever matching
+    # another's.
+
+    def __init__(self, max_age: float = ETAG_MAX_AGE_SECONDS):
+        self.max_age = max_age
+        self.boot_id = uuid.uuid4().hex[:8]
+        self.version = 0
+        self._epoch = 0
+        self._books = {}
+        self._lock = threading.Lock()
+
+    def bump(self, book_id: int = None):
+        with self._lock:
+            self.version += 1
+            if book_id is None:
+                # bulk change: every per-book tag moves with the epoch
+                self._epoch += 1
+                self._books.clear()
+            else:
+                self._books[book_id] = self._books.get(book_id, 0) + 1
+
+    def _window(self) -> int:
+        return int(time.time() // self.max_age)
+
+    def book_etag(self, book_id: int) -> str:
+        with self._lock:
+            version = f"{self._epoch}.{self._books.get(book_id, 0)}"
+        return f'W/"b{book_id}.{self.boot_id}.{self._window()}.{version}"'
+
+    def catalog_etag(self, query: str) -> str:
+        digest = hashlib.md5(query.encode()).hexdigest()[:12]
+        return f'W/"c.{self.boot_id}.{self._window()}.{self.version}.{digest}"'
+
+
+catalog_version = CatalogVersion()
+
+
+def matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # weak comparison: W/"x" and "x" name the same representation
+    wanted = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == wanted for tag in header.split(","))
@@ -3,7 +3,7 @@ from dotenv import load_dotenv
 from sqlalchemy.orm import Session
 from passlib.context import CryptContext
 from app.database import SessionLocal
-from app.models import User
+from app.models import User, normalize_email
 
 load_dotenv()
 
@@ -20,7 +20,7 @@ def create_admin(db: Session = None):  # ✅ Make db optional
     else:
         own_session = False
 
-    existing = db.query(User).filter(User.email == ADMIN_EMAIL).first()
+    existing = db.query(User).filter(User.email_normalized == normalize_email(ADMIN_EMAIL)).first()
     if not existing:
         hashed_password = pwd_context.hash(ADMIN_PASSWORD)
         admin_user = User(
@@ -0,0 +1,33 @@
+import re
+
+_SEPARATORS = re.compile(r"[\s\-]")
+_ISBN_CHARS = re.compile(r"^\d+X?$")
+
+
+def _is_valid_isbn10(value: str) -> bool:
+    if len(value) != 10 or not value[:9].isdigit():
+        return False
+    digits = [10 if ch == "X" else int(ch) for ch in value]
+    return sum((10 - i) * d for i, d in enumerate(digits)) % 11 == 0
+
+
+def _isbn13_check_digit(first12: str) -> str:
+    total = sum(int(ch) * (1 if i % 2 == 0 else 3) for i, ch in enumerate(first12))
+    return str((10 - total % 10) % 10)
+
+
+def normalize_isbn(raw: str):
+    # Strip hyphens/spaces and upper-case the check digit. Valid ISBN-10s are
+    # stored as their ISBN-13 so a scan of either barcode finds the same row.
+    # Other digit strings are kept as-is for legacy catalog identifiers.
+    if raw is None:
+        return None
+    value = _SEPARATORS.sub("", raw).upper()
+    if not value:
+        return None
+    if not _ISBN_CHARS.match(value):
+        raise ValueError(f"Invalid ISBN: {raw}")
+    if _is_valid_isbn10(value):
+        first12 = "978" + value[:9]
+        return first12 + _isbn13_check_digit(first12)
+    return value
@@ -0,0 +1,211 @@
+import logging
+import os
+from datetime import datetime
+from app.core import schema, search
+
+logger = logging.getLogger(__name__)
+
+# Versioned schema changes. Applied versions are recorded in
+# schema_migrations; each migration runs once per database, in order, in its
+# own transaction. Append new ones at the end, never edit or renumber one
+# that has shipped. Each spells out its own DDL rather than reading the
+# models, so it does the same thing however the models change later; a model
+# change ships with a new migration.
+#
+#     python -m app.core.migrations status
+#     python -m app.core.migrations upgrade
+
+# Upgrade on startup. Set AUTO_MIGRATE=0 to require an explicit upgrade; the
+# app then refuses to start while migrations are pending.
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "1").lower() not in ("0", "false", "no")
+
+
+# The schema as of version 1. IF NOT EXISTS leaves tables an older database
+# already has alone; versions 2 and 4 bring those up to the same shape.
+_TABLES_DDL = [
+    """CREATE TABLE IF NOT EXISTS users (
+        id INTEGER NOT NULL,
+        name VARCHAR,
+        email VARCHAR,
+        email_normalized VARCHAR,
+        password VARCHAR,
+        role VARCHAR,
+        is_varified BOOLEAN,
+        otp VARCHAR,
+        otp_expires DATETIME,
+        PRIMARY KEY (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS books (
+        id INTEGER NOT NULL,
+        title VARCHAR NOT NULL,
+        author VARCHAR NOT NULL,
+        isbn VARCHAR,
+        total_copies INTEGER,
+        borrowed_copies INTEGER,
+        available_copies INTEGER,
+        updated_at DATETIME,
+        PRIMARY KEY (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS loans (
+        id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        book_id INTEGER NOT NULL,
+        channel VARCHAR NOT NULL,
+        loan_date DATETIME,
+        due_date DATETIME,
+        return_date DATETIME,
+        fine_cents INTEGER,
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES users (id),
+        FOREIGN KEY(book_id) REFERENCES books (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS reconciliation_runs (
+        id INTEGER NOT NULL,
+        started_at DATETIME NOT NULL,
+        finished_at DATETIME,
+        "full" BOOLEAN,
+        books_checked INTEGER,
+        books_fixed INTEGER,
+        PRIMARY KEY (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS blacklisted_tokens (
+        id INTEGER NOT NULL,
+        token VARCHAR NOT NULL,
+        blacklisted_at DATETIME,
+        jti VARCHAR,
+        expires_at DATETIME,
+        PRIMARY KEY (id),
+        UNIQUE (token)
+    )""",
+]
+
+_INDEXES_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_users_id ON users (id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_email_normalized ON users (email_normalized)",
+    "CREATE INDEX IF NOT EXISTS ix_books_id ON books (id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_books_isbn ON books (isbn)",
+    "CREATE INDEX IF NOT EXISTS ix_books_author_id ON books (author, id)",
+    "CREATE INDEX IF NOT EXISTS ix_books_updated_at ON books (updated_at)",
+    "CREATE INDEX IF NOT EXISTS ix_loans_id ON loans (id)",
+    "CREATE INDEX IF NOT EXISTS ix_loans_book_id_loan_date ON loans (book_id, loan_date)",
+    "CREATE INDEX IF NOT EXISTS ix_loans_user_id_loan_date ON loans (user_id, loan_date)",
+    "CREATE INDEX IF NOT EXISTS ix_loans_open ON loans (id) WHERE return_date IS NULL",
+    "CREATE INDEX IF NOT EXISTS ix_loans_open_user_id ON loans (user_id) WHERE return_date IS NULL",
+    "CREATE INDEX IF NOT EXISTS ix_loans_open_book_id ON loans (book_id) WHERE return_date IS NULL",
+    "CREATE INDEX IF NOT EXISTS ix_loans_open_due_date ON loans (due_date) WHERE return_date IS NULL",
+    "CREATE INDEX IF NOT EXISTS ix_loans_due_date ON loans (due_date, id, return_date, user_id, fine_cents)",
+    "CREATE INDEX IF NOT EXISTS ix_reconciliation_runs_id ON reconciliation_runs (id)",
+    "CREATE INDEX IF NOT EXISTS ix_blacklisted_tokens_id ON blacklisted_tokens (id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_blacklisted_tokens_jti ON blacklisted_tokens (jti)",
+    "CREATE INDEX IF NOT EXISTS ix_blacklisted_tokens_expires_at ON blacklisted_tokens (expires_at)",
+]
+
+
+def _create_tables(connection):
+    for statement in _TABLES_DDL:
+        connection.exec_driver_sql(statement)
+
+
+def _add_columns(connection):
+    schema.add_column(connection, "books", "updated_at", "DATETIME",
+                      backfill="UPDATE books SET updated_at = " + schema.sqlite_datetime("'now'"))
+    # only the oldest account per normalized address gets it: the column is
+    # unique, and NULL keeps later duplicates out of the way of its index
+    schema.add_column(connection, "users", "email_normalized", "VARCHAR", backfill=(
+        "UPDATE users SET email_normalized = lower(trim(email)) WHERE email IS NOT NULL AND id = "
+        "(SELECT min(id) FROM users AS first WHERE lower(trim(first.email)) = lower(trim(users.email)))"
+    ))
+    left_out = connection.exec_driver_sql(
+        "SELECT id FROM users WHERE email IS NOT NULL AND email_normalized IS NULL ORDER BY id"
+    ).scalars().all()
+    if left_out:
+        logger.warning("Users %s share an address with an older account up to case and are only "
+                       "found by their exact email", left_out)
+    schema.add_column(connection, "blacklisted_tokens", "jti", "VARCHAR")
+    schema.add_column(connection, "blacklisted_tokens", "expires_at", "DATETIME")
+
+
+def _create_indexes(connection):
+    # the unique isbn index must be built over stored values in their lookup form
+    schema.normalize_isbns(connection)
+    schema.dedupe_isbns(connection)
+    for statement in _INDEXES_DDL:
+        connection.exec_driver_sql(statement)
+
+
+MIGRATIONS = (
+    (1, "create tables", _create_tables),
+    (2, "columns added to existing tables", _add_columns),
+    (3, "move borrows and issued_books into the loans ledger", schema.migrate_legacy_loans),
+    # users.email_normalized, books.isbn, loans foreign keys and dates, ...
+    (4, "indexes for the hot queries", _create_indexes),
+    (5, "full-text search over books", search.ensure_fts),
+)
+
+_TABLE_DDL = """CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name VARCHAR NOT NULL,
+    applied_at DATETIME NOT NULL
+)"""
+
+
+def applied(engine):
+    with engine.begin() as connection:
+        connection.exec_driver_sql(_TABLE_DDL)
+        return dict(connection.exec_driver_sql("SELECT version, applied_at FROM schema_migrations").all())
+
+
+def pending(engine):
+    done = applied(engine)
+    return [(version, name) for version, name, _ in MIGRATIONS if version not in done]
+
+
+def upgrade(engine):
+    done = applied(engine)
+    ran = []
+    for version, name, migrate in MIGRATIONS:
+        if version in done:
+            continue
+        with engine.begin() as connection:
+            migrate(connection)
+            connection.exec_driver_sql(
+                "INSERT INTO schema_migrations (version, name, applied_at) VALUES (?, ?, ?)",
+                (version, name, datetime.utcnow().isoformat(" ")),
+            )
+        logger.info("Applied migration %d: %s", version, name)
+        ran.append(version)
+    return ran
+
+
+def status(engine):
+    done = applied(engine)
+    return [(version, name, done.get(version)) for version, name, _ in MIGRATIONS]
+
+
+def startup(engine):
+    if AUTO_MIGRATE:
+        upgrade(engine)
+        return
+    waiting = pending(engine)
+    if waiting:
+        raise RuntimeError(
+            f"Database schema is behind by {len(waiting)} migration(s) "
+            f"{[version for version, _ in waiting]}; run: python -m app.core.migrations upgrade"
+        )
+
+
+if __name__ == "__main__":
+    import argparse
+    from app.database import engine
+
+    parser = argparse.ArgumentParser(description="Database schema migrations")
+    parser.add_argument("command", choices=("status", "upgrade"), nargs="?", default="status")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if args.command == "upgrade":
+        ran = upgrade(engine)
+        print(f"applied {len(ran)} migration(s)" if ran else "already up to date")
+    else:
+        for version, name, applied_at in status(engine):
+            print(f"{version:>4}  {applied_at or 'pending':<26}  {name}")
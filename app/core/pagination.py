@@ -0,0 +1,20 @@
+import base64
+import json
+from datetime import datetime
+from fastapi import HTTPException
+
+# Opaque cursors for keyset pagination over (timestamp, id) orderings.
+
+
+def encode_cursor(moment: datetime, row_id: int) -> str:
+    raw = json.dumps([moment.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        moment, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(moment), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
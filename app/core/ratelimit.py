@@ -0,0 +1,81 @@
+import math
+import threading
+import time
+from fastapi import HTTPException, Request, status
+
+# Seconds between sweeps that drop idle buckets.
+EVICT_INTERVAL_SECONDS = 60
+
+_limiters = []
+
+
+class RateLimiter:
+    # In-process token buckets, one per key (client IP, email, ...). Each key
+    # may burst `capacity` requests and then gets one more every
+    # per_seconds / capacity seconds. A check is a dict lookup and a little
+    # arithmetic. A bucket left alone long enough to refill completely is
+    # indistinguishable from a new one, so the periodic sweep drops those.
+
+    def __init__(self, name: str, capacity: int, per_seconds: float):
+        self.name = name
+        self.capacity = capacity
+        self.rate = capacity / per_seconds
+        self.allowed = 0
+        self.rejected = 0
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        _limiters.append(self)
+
+    def check(self, key: str):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_sweep >= EVICT_INTERVAL_SECONDS:
+                self._sweep(now)
+
+            tokens, last = self._buckets.get(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - last) * self.rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                self.rejected += 1
+                retry_after = math.ceil((1 - tokens) / self.rate)
+            else:
+                self._buckets[key] = (tokens - 1, now)
+                self.allowed += 1
+                return
+
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests, try again later",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    def by_client_ip(self, request: Request):
+        # usable directly as a route dependency
+        self.check(request.client.host if request.client else "unknown")
+
+    def _sweep(self, now: float):
+        full_after = self.capacity / self.rate
+        self._buckets = {
+            key: bucket for key, bucket in self._buckets.items() if now - bucket[1] < full_after
+        }
+        self._last_sweep = now
+
+    def stats(self):
+        with self._lock:
+            return {"allowed": self.allowed, "rejected": self.rejected, "buckets": len(self._buckets)}
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+            self.allowed = 0
+            self.rejected = 0
+
+
+def stats():
+    return {limiter.name: limiter.stats() for limiter in _limiters}
+
+
+def reset_all():
+    for limiter in _limiters:
+        limiter.reset()
@@ -0,0 +1,101 @@
+from datetime import datetime
+from sqlalchemy import DateTime, bindparam, text
+from sqlalchemy.orm import Session
+from app.models import ReconciliationRun
+
+# Copy counters are derived data: borrowed_copies is the number of open loans
+# and available_copies is what is left of total_copies, never below 0 (the
+# same clamp update_book and the import apply when total_copies shrinks under
+# the copies on loan). This job recomputes both from the loans ledger and
+# fixes rows that have drifted.
+
+# One GROUP BY over the open-loan partial index, joined back to the books
+# being checked. {where} limits both sides to the books changed since the
+# last run when the job runs incrementally.
+_EXPECTED_SQL = """
+    SELECT books.id, books.borrowed_copies, books.available_copies,
+           COALESCE(books.total_copies, 0), COALESCE(open_loans.loans, 0)
+    FROM books
+    LEFT JOIN (
+        SELECT book_id, count(*) AS loans FROM loans
+        WHERE return_date IS NULL {loan_where}
+        GROUP BY book_id
+    ) AS open_loans ON open_loans.book_id = books.id
+    {where}
+    ORDER BY books.id
+"""
+_CHANGED = "books.updated_at >= :since OR books.updated_at IS NULL"
+
+# Conditional on the values just read, so a borrow or return committed in
+# between is never overwritten; that book is picked up by the next run.
+_FIX_SQL = text("""
+    UPDATE books SET borrowed_copies = :borrowed, available_copies = :available
+    WHERE id = :id AND borrowed_copies IS :old_borrowed AND available_copies IS :old_available
+""")
+
+
+def last_run(db: Session):
+    return (
+        db.query(ReconciliationRun)
+        .filter(ReconciliationRun.finished_at.isnot(None))
+        .order_by(ReconciliationRun.id.desc())
+        .first()
+    )
+
+
+def reconcile_counters(db: Session, full: bool = False):
+    started = datetime.utcnow()
+    previous = None if full else last_run(db)
+    since = previous.started_at if previous else None
+
+    if since is None:
+        sql = text(_EXPECTED_SQL.format(loan_where="", where=""))
+    else:
+        sql = text(_EXPECTED_SQL.format(
+            loan_where=f"AND book_id IN (SELECT id FROM books WHERE {_CHANGED})",
+            where=f"WHERE {_CHANGED}",
+        )).bindparams(bindparam("since", type_=DateTime()))
+    rows = db.execute(sql, {"since": since} if since is not None else {}).all()
+
+    drifted = []
+    for book_id, borrowed, available, total, open_loans in rows:
+        expected_available = max(total - open_loans, 0)
+        if borrowed != open_loans or available != expected_available:
+            drifted.append({
+                "book_id": book_id,
+                "borrowed_copies": borrowed,
+                "available_copies": available,
+                "expected_borrowed": open_loans,
+                "expected_available": expected_available,
+            })
+
+    fixed = 0
+    if drifted:
+        fixed = db.execute(_FIX_SQL, [
+            {"id": d["book_id"], "borrowed": d["expected_borrowed"], "available": d["expected_available"],
+             "old_borrowed": d["borrowed_copies"], "old_available": d["available_copies"]}
+            for d in drifted
+        ]).rowcount
+
+    db.add(ReconciliationRun(
+        started_at=started, finished_at=datetime.utcnow(), full=since is None,
+        books_checked=len(rows), books_fixed=fixed,
+    ))
+    db.commit()
+    return {"since": since, "books_checked": len(rows), "books_fixed": fixed, "drifted": drifted}
+
+
+if __name__ == "__main__":
+    import argparse
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Recompute book copy counters from open loans")
+    parser.add_argument("--full", action="store_true", help="check every book, not just those changed since the last run")
+    args = parser.parse_args()
+
+    with SessionLocal() as session:
+        report = reconcile_counters(session, full=args.full)
+    for d in report["drifted"]:
+        print(f"book {d['book_id']}: borrowed {d['borrowed_copies']} -> {d['expected_borrowed']}, "
+              f"available {d['available_copies']} -> {d['expected_available']}")
+    print(f"checked {report['books_checked']} books, fixed {report['books_fixed']}")
@@ -0,0 +1,126 @@
+import asyncio
+import calendar
+import hashlib
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from jose import JWTError, jwt
+from sqlalchemy.orm import Session
+from app.models import BlacklistedToken
+
+logger = logging.getLogger(__name__)
+
+# How often each process drops expired revocations and picks up ones
+# written by other processes.
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", "300"))
+
+
+def token_jti(token: str, claims: dict) -> str:
+    # tokens issued before jti existed are identified by their digest
+    return claims.get("jti") or hashlib.sha256(token.encode()).hexdigest()
+
+
+class RevocationSet:
+    # Revoked jti -> expiry (epoch seconds). blacklisted_tokens is the
+    # durable copy; requests only ever consult this dict, so a revocation
+    # check is a lookup, not a query. An entry is only needed until its
+    # token would have expired anyway.
+
+    def __init__(self):
+        self._revoked = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, jti: str) -> bool:
+        expires_at = self._revoked.get(jti)
+        return expires_at is not None and expires_at > time.time()
+
+    def __len__(self):
+        return len(self._revoked)
+
+    def add(self, jti: str, expires_at: float):
+        with self._lock:
+            self._revoked[jti] = expires_at
+
+    def merge(self, revoked: dict):
+        # Revocations are never undone, so entries made since `revoked` was
+        # read stay; only the ones whose tokens have expired are dropped.
+        now = time.time()
+        with self._lock:
+            current = {jti: exp for jti, exp in self._revoked.items() if exp > now}
+            current.update(revoked)
+            self._revoked = current
+
+    def clear(self):
+        with self._lock:
+            self._revoked = {}
+
+
+revoked_tokens = RevocationSet()
+
+
+def _unverified_claims(token: str) -> dict:
+    try:
+        return jwt.get_unverified_claims(token)
+    except JWTError:
+        return {}
+
+
+def _as_datetime(exp):
+    return datetime.utcfromtimestamp(exp) if exp is not None else None
+
+
+def revoke(db: Session, token: str, claims: dict):
+    jti = token_jti(token, claims)
+    exp = claims.get("exp")
+    db.add(BlacklistedToken(token=token, jti=jti, expires_at=_as_datetime(exp)))
+    db.commit()
+    revoked_tokens.add(jti, exp if exp is not None else float("inf"))
+
+
+def load(db: Session):
+    # Rows written before the jti/expires_at columns existed get both
+    # filled in from the stored token the first time they are loaded.
+    for row in db.query(BlacklistedToken).filter(BlacklistedToken.jti.is_(None)):
+        claims = _unverified_claims(row.token)
+        row.jti = token_jti(row.token, claims)
+        row.expires_at = _as_datetime(claims.get("exp"))
+    db.commit()
+
+    revoked = {}
+    rows = db.query(BlacklistedToken.jti, BlacklistedToken.expires_at).filter(
+        (BlacklistedToken.expires_at.is_(None)) | (BlacklistedToken.expires_at > datetime.utcnow())
+    )
+    for jti, expires_at in rows:
+        revoked[jti] = calendar.timegm(expires_at.utctimetuple()) if expires_at else float("inf")
+    revoked_tokens.merge(revoked)
+    return len(revoked)
+
+
+def prune(db: Session):
+    pruned = (
+        db.query(BlacklistedToken)
+        .filter(BlacklistedToken.expires_at < datetime.utcnow())
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return pruned
+
+
+def sync():
+    from app.database import SessionLocal
+
+    with SessionLocal() as db:
+        pruned = prune(db)
+        loaded = load(db)
+    logger.info("Revocations: pruned %d expired, %d active", pruned, loaded)
+
+
+async def sync_forever(interval: float = REVOCATION_SYNC_SECONDS):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(sync)
+        except Exception:
+            logger.exception("Revocation sync failed")
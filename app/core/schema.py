@@ -0,0 +1,119 @@
+import logging
+from sqlalchemy import inspect
+from app.core.circulation import LOAN_PERIOD_DAYS
+from app.core.isbn import normalize_isbn
+
+logger = logging.getLogger(__name__)
+
+# Building blocks for app.core.migrations. Each one inspects the database
+# first and does nothing if its change is already there, so a migration
+# behaves the same on a fresh database (where version 1 has built the tables
+# in full) and on an old one.
+
+# SQLAlchemy's storage format for DateTime on SQLite (microsecond precision),
+# so backfilled values compare and sort like ones written by the ORM.
+_SQLITE_DATETIME = "strftime('%Y-%m-%d %H:%M:%f', {}, '{}') || '000'"
+
+# Pre-ledger loan tables: (table, start date column, channel). Desk issues
+# keep their ids, since those are what the desk has on paper; borrows are
+# appended after them with fresh ids.
+_LEGACY_LOANS = (
+    ("issued_books", "issue_date", "issue"),
+    ("borrows", "borrow_date", "borrow"),
+)
+
+
+def sqlite_datetime(expression: str, modifier: str = "+0 seconds"):
+    return _SQLITE_DATETIME.format(expression, modifier)
+
+
+# Add a column missing from an existing table, then run its backfill.
+# SQLite can only add nullable columns without a default this way.
+def add_column(connection, table_name: str, column_name: str, column_type: str, backfill: str = None):
+    existing = {column["name"] for column in inspect(connection).get_columns(table_name)}
+    if column_name in existing:
+        return
+    connection.exec_driver_sql(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}")
+    if backfill:
+        connection.exec_driver_sql(backfill)
+    logger.info("Added column %s.%s", table_name, column_name)
+
+
+# Rewrite stored ISBNs into the form lookups and imports normalize to, so a
+# legacy "0-262-51087-1" is found by a scan of either barcode. When several
+# rows normalize to the same ISBN only the oldest is rewritten; the others
+# keep their value and are reported, as are values that aren't ISBNs at all.
+def normalize_isbns(connection):
+    rows = connection.exec_driver_sql("SELECT id, isbn FROM books WHERE isbn IS NOT NULL ORDER BY id").all()
+    by_isbn = {}
+    for book_id, raw in rows:
+        try:
+            isbn = normalize_isbn(raw)
+        except ValueError:
+            logger.warning("Book %d has an invalid ISBN %r, left unchanged", book_id, raw)
+            continue
+        by_isbn.setdefault(isbn, []).append((book_id, raw))
+
+    updates = []
+    for isbn, books in by_isbn.items():
+        (book_id, raw), *others = books
+        if raw != isbn:
+            updates.append((isbn, book_id))
+        # exact copies of the normal form are left to dedupe_isbns
+        unchanged = [other_id for other_id, other_raw in others if other_raw != isbn]
+        if unchanged:
+            logger.warning("Books %s have the same ISBN %s as book %d, left unchanged", unchanged, isbn, book_id)
+    if updates:
+        connection.exec_driver_sql("UPDATE books SET isbn = ? WHERE id = ?", updates)
+    logger.info("Normalized %d stored ISBNs", len(updates))
+
+
+# The unique isbn index, which the catalog import's upsert relies on, can't be
+# built over legacy duplicates. The oldest row keeps the ISBN; later ones
+# lose it, and the cleared values are kept in books_duplicate_isbns so they
+# can be restored once the books are re-catalogued.
+def dedupe_isbns(connection):
+    duplicates = connection.exec_driver_sql(
+        "SELECT id, isbn FROM books AS later WHERE isbn IS NOT NULL AND id > "
+        "(SELECT min(id) FROM books AS first WHERE first.isbn = later.isbn) ORDER BY id"
+    ).all()
+    if not duplicates:
+        return
+    connection.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS books_duplicate_isbns (book_id INTEGER PRIMARY KEY, isbn VARCHAR NOT NULL)"
+    )
+    connection.exec_driver_sql("INSERT INTO books_duplicate_isbns (book_id, isbn) VALUES (?, ?)",
+                               [tuple(row) for row in duplicates])
+    connection.exec_driver_sql("UPDATE books SET isbn = NULL WHERE id = ?", [(book_id,) for book_id, _ in duplicates])
+    logger.warning("Moved duplicate ISBNs of books %s to books_duplicate_isbns",
+                   {book_id: isbn for book_id, isbn in duplicates})
+
+
+# Move rows from the old per-channel loan tables into the loans ledger, then
+# rename each old table to <name>_legacy so this runs once per database.
+# Issues never counted towards borrowed_copies before; their open loans are
+# added to the counter here since returns now release both counters.
+def migrate_legacy_loans(connection):
+    inspector = inspect(connection)
+    for table, start_column, channel in _LEGACY_LOANS:
+        if not inspector.has_table(table):
+            continue
+        columns = {column["name"] for column in inspector.get_columns(table)}
+        computed_due = sqlite_datetime(start_column, f"+{LOAN_PERIOD_DAYS} days")
+        due_date = f"COALESCE(due_date, {computed_due})" if "due_date" in columns else computed_due
+        fine_cents = "fine_cents" if "fine_cents" in columns else "NULL"
+        loan_id = "id" if channel == "issue" else "NULL"
+
+        if channel == "issue":
+            connection.exec_driver_sql(
+                "UPDATE books SET borrowed_copies = COALESCE(borrowed_copies, 0) + "
+                "(SELECT count(*) FROM issued_books"
+                " WHERE issued_books.book_id = books.id AND issued_books.return_date IS NULL)"
+            )
+        copied = connection.exec_driver_sql(
+            "INSERT INTO loans (id, user_id, book_id, channel, loan_date, due_date, return_date, fine_cents) "
+            f"SELECT {loan_id}, user_id, book_id, '{channel}', {start_column}, {due_date}, return_date, {fine_cents} "
+            f"FROM {table} WHERE user_id IS NOT NULL AND book_id IS NOT NULL ORDER BY id"
+        ).rowcount
+        connection.exec_driver_sql(f"ALTER TABLE {table} RENAME TO {table}_legacy")
+        logger.info("Moved %d rows from %s into loans", copied, table)
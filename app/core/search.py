@@ -0,0 +1,90 @@
+import re
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from app.models import Book
+
+# External-content FTS5 index over books; rowid is books.id.
+FTS_TABLE = "books_fts"
+
+# bm25 column weights for (title, author, isbn)
+RANK_WEIGHTS = (10.0, 5.0, 1.0)
+
+_FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, author, isbn,
+        content='books', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, author, isbn)
+        VALUES (new.id, new.title, new.author, new.isbn);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author, isbn)
+        VALUES ('delete', old.id, old.title, old.author, old.isbn);
+    END""",
+    # only reindex when searchable columns change, not on every copy-counter update
+    f"""CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF title, author, isbn ON books BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author, isbn)
+        VALUES ('delete', old.id, old.title, old.author, old.isbn);
+        INSERT INTO {FTS_TABLE}(rowid, title, author, isbn)
+        VALUES (new.id, new.title, new.author, new.isbn);
+    END""",
+]
+
+_SEARCH_SQL = text(f"""
+    SELECT books.* FROM {FTS_TABLE}
+    JOIN books ON books.id = {FTS_TABLE}.rowid
+    WHERE {FTS_TABLE} MATCH :match
+    ORDER BY bm25({FTS_TABLE}, {", ".join(str(w) for w in RANK_WEIGHTS)}), books.id
+    LIMIT :limit OFFSET :offset
+""")
+
+
+def install_fts(connection):
+    if connection.dialect.name != "sqlite":
+        return
+    for statement in _FTS_DDL:
+        connection.exec_driver_sql(statement)
+
+
+# Databases whose books table predates the index get it created and backfilled here.
+def ensure_fts(connection):
+    if connection.dialect.name != "sqlite":
+        return
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+    ).first()
+    install_fts(connection)
+    if not exists:
+        connection.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def build_match_query(q: str):
+    # Quote every term so user input can never be parsed as FTS5 syntax;
+    # the trailing * makes each term a prefix match.
+    terms = re.findall(r"\w+", q)
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def search(db: Session, q: str, limit: int, offset: int):
+    match = build_match_query(q)
+    if not match:
+        return []
+    return (
+        db.query(Book)
+        .from_statement(_SEARCH_SQL)
+        .params(match=match, limit=limit, offset=offset)
+        .all()
+    )
+
+
+@event.listens_for(Book.__table__, "after_create")
+def _create_fts(target, connection, **kw):
+    install_fts(connection)
+
+
+@event.listens_for(Book.__table__, "before_drop")
+def _drop_fts(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {FTS_TABLE}")
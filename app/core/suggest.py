@@ -0,0 +1,99 @@
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import Book
+
+SUGGEST_FIELDS = ("title", "author")
+
+
+def normalize(value: str) -> str:
+    # "Théâtre  d'Ombres" -> "theatre d ombres"
+    value = unicodedata.normalize("NFKD", value or "")
+    value = "".join(ch for ch in value if not unicodedata.combining(ch))
+    return " ".join(re.findall(r"\w+", value.lower()))
+
+
+class PrefixIndex:
+    # Sorted (key, book_id, field) tuples answer a prefix query with one
+    # bisect plus a short forward scan. Every word start of a title/author is
+    # a key, so "habits" also finds "Atomic Habits".
+
+    def __init__(self):
+        self._keys = []
+        self._books = {}
+        self._lock = threading.Lock()
+
+    def _entries(self, book_id: int, values: dict):
+        for field in SUGGEST_FIELDS:
+            words = normalize(values[field]).split()
+            for start in range(len(words)):
+                yield (" ".join(words[start:]), book_id, field)
+
+    def _remove_locked(self, book_id: int):
+        values = self._books.pop(book_id, None)
+        if values is None:
+            return
+        for entry in self._entries(book_id, values):
+            i = bisect_left(self._keys, entry)
+            if i < len(self._keys) and self._keys[i] == entry:
+                del self._keys[i]
+
+    def add(self, book_id: int, title: str, author: str):
+        values = {"title": title or "", "author": author or ""}
+        with self._lock:
+            self._remove_locked(book_id)
+            self._books[book_id] = values
+            for entry in self._entries(book_id, values):
+                insort(self._keys, entry)
+
+    def remove(self, book_id: int):
+        with self._lock:
+            self._remove_locked(book_id)
+
+    def rebuild(self, rows):
+        books = {book_id: {"title": title or "", "author": author or ""} for book_id, title, author in rows}
+        keys = sorted(entry for book_id, values in books.items() for entry in self._entries(book_id, values))
+        with self._lock:
+            self._books = books
+            self._keys = keys
+
+    def suggest(self, prefix: str, limit: int):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        results = []
+        seen = set()
+        with self._lock:
+            i = bisect_left(self._keys, (prefix,))
+            while i < len(self._keys) and len(results) < limit:
+                key, book_id, field = self._keys[i]
+                if not key.startswith(prefix):
+                    break
+                if (book_id, field) not in seen:
+                    seen.add((book_id, field))
+                    results.append({"book_id": book_id, "field": field, "value": self._books[book_id][field]})
+                i += 1
+        return results
+
+    def __len__(self):
+        return len(self._books)
+
+
+index = PrefixIndex()
+
+
+def load_index(db: Session = None):
+    if db is None:
+        db = SessionLocal()
+        own_session = True
+    else:
+        own_session = False
+
+    index.rebuild(db.query(Book.id, Book.title, Book.author))
+
+    if own_session:
+        db.close()
@@ -1,13 +1,125 @@
-from sqlalchemy import create_engine
+import os
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, event, make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-SQL_ALCHEMY_DATABASE_URL = 'sqlite:///./liberary.db'
+load_dotenv()
 
-engine = create_engine(SQL_ALCHEMY_DATABASE_URL, connect_args={
-                       "check_same_thread": False})
+SQL_ALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", 'sqlite:///./liberary.db')
+
+# Storage profile applied to every new SQLite connection. WAL lets readers
+# carry on while a writer commits, and synchronous=NORMAL only fsyncs at
+# checkpoints instead of on every commit (a power cut can lose the last few
+# commits, never corrupt the file). Set SQLITE_PROFILE=default to get
+# SQLite's stock behaviour back.
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "wal")
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    # negative means KiB: 64 MiB of page cache per connection
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+
+
+def apply_sqlite_pragmas(engine, pragmas: dict = SQLITE_PRAGMAS):
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+
+def make_engine(url: str = SQL_ALCHEMY_DATABASE_URL, profile: str = SQLITE_PROFILE):
+    if not url.startswith("sqlite"):
+        return create_engine(url, pool_pre_ping=True)
+    sqlite_engine = create_engine(url, connect_args={
+                                  "check_same_thread": False})
+    if profile != "default":
+        apply_sqlite_pragmas(sqlite_engine)
+    return sqlite_engine
+
+
+# Connections that can only read, for the GET routes. Kept apart from the
+# primary pool so catalog reads never queue for a connection behind writes;
+# with WAL they don't wait on a writer's lock either. query_only makes any
+# stray write through them fail instead of taking the write lock.
+READ_POOL_SIZE = int(os.getenv("READ_POOL_SIZE", str((os.cpu_count() or 1) * 2)))
+
+
+def make_read_engine(url: str = SQL_ALCHEMY_DATABASE_URL, profile: str = SQLITE_PROFILE):
+    if not url.startswith("sqlite"):
+        return create_engine(os.getenv("DATABASE_READ_URL", url), pool_pre_ping=True)
+    read_engine = create_engine(url, connect_args={"check_same_thread": False},
+                                pool_size=READ_POOL_SIZE, max_overflow=READ_POOL_SIZE)
+    if profile != "default":
+        apply_sqlite_pragmas(read_engine)
+    apply_sqlite_pragmas(read_engine, {"query_only": "ON"})
+    return read_engine
+
+
+engine = make_engine()
+read_engine = make_read_engine()
 
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False,)
+ReadSessionLocal = sessionmaker(bind=read_engine, autocommit=False, autoflush=False,)
+
+# Async twins of the two engines, for the `async def` versions of the hot
+# routes. They are opt-in (ASYNC_ROUTES=1): a request waiting on the
+# database then parks a coroutine instead of one of the threadpool's
+# workers, but with aiosqlite every query also hops to a per-connection
+# thread, which costs more than it saves on a small box (see
+# benchmarks/bench_async_load.py). The pragmas still go through the
+# underlying sync engine.
+ASYNC_ROUTES = os.getenv("ASYNC_ROUTES", "0").lower() in ("1", "true", "yes")
+
+
+def async_url(url: str = SQL_ALCHEMY_DATABASE_URL):
+    # SQLite has a known async driver; any other backend names its own in ASYNC_DATABASE_URL
+    backend, _, rest = url.partition(":")
+    if backend in ("sqlite", "sqlite+pysqlite"):
+        return "sqlite+aiosqlite:" + rest
+    return url
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", async_url())
+
+
+def make_async_engine(url: str = ASYNC_DATABASE_URL, profile: str = SQLITE_PROFILE, read_only: bool = False):
+    driver = make_url(url)
+    if not driver.get_dialect().is_async:
+        raise RuntimeError(
+            f"{driver.drivername} is not an async driver; set ASYNC_DATABASE_URL to the same database "
+            "through one (e.g. postgresql+asyncpg://...) to use the async routes"
+        )
+    if not url.startswith("sqlite"):
+        return create_async_engine(url, pool_pre_ping=True)
+    pool_args = {"pool_size": READ_POOL_SIZE, "max_overflow": READ_POOL_SIZE} if read_only else {}
+    sqlite_engine = create_async_engine(url, **pool_args)
+    if profile != "default":
+        apply_sqlite_pragmas(sqlite_engine.sync_engine)
+    if read_only:
+        apply_sqlite_pragmas(sqlite_engine.sync_engine, {"query_only": "ON"})
+    return sqlite_engine
+
+
+# Built on first use, so a deployment that never enables the async routes
+# needs neither an async driver nor a valid ASYNC_DATABASE_URL.
+_async_sessions = {}
+
+
+def async_sessions(read_only: bool = False):
+    if read_only not in _async_sessions:
+        _async_sessions[read_only] = async_sessionmaker(
+            bind=make_async_engine(read_only=read_only), autoflush=False, expire_on_commit=False
+        )
+    return _async_sessions[read_only]
+
 
 Base = declarative_base()
 
@@ -16,4 +128,22 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db():
+    async with async_sessions()() as db:
+        yield db
+
+
+async def get_async_read_db():
+    async with async_sessions(read_only=True)() as db:
+        yield db
@@ -1,10 +1,58 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
 
 pwd_cxt = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt is deliberately slow and holds the GIL, so it runs in its own
+# processes instead of FastAPI's shared worker threads. At most
+# HASH_QUEUE_SIZE operations may be running or waiting at once; past that a
+# request fails fast with 503 rather than parking another worker thread.
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+HASH_QUEUE_SIZE = int(os.getenv("HASH_QUEUE_SIZE", str(HASH_WORKERS * 4)))
+HASH_RETRY_AFTER_SECONDS = 1
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(HASH_QUEUE_SIZE)
+
+
+def _hash(password: str):
+    return pwd_cxt.hash(password)
+
+
+def _verify(plain_password, hashed_password):
+    return pwd_cxt.verify(plain_password, hashed_password)
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a process that already runs threads can deadlock
+            _pool = ProcessPoolExecutor(HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _run(fn, *args):
+    if not _slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many password operations in progress, try again shortly",
+            headers={"Retry-After": str(HASH_RETRY_AFTER_SECONDS)},
+        )
+    try:
+        return _get_pool().submit(fn, *args).result()
+    finally:
+        _slots.release()
+
+
 class Hash():
     def bcrypt(password: str):
-        return pwd_cxt.hash(password)
+        return _run(_hash, password)
 
     def verify(hashed_password,plain_password):
-        return pwd_cxt.verify(plain_password,hashed_password)
\ No newline at end of file
+        return _run(_verify, plain_password, hashed_password)
@@ -1,17 +1,31 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app import models
 from app.database import engine
 from app.routers import auth
 from app.routers import book, user, issue
 from app.core.init_admin import create_admin
+from app.core import migrations, revocation, suggest
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.routers import member
 import os
 
-models.Base.metadata.create_all(engine)
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # schema and startup data are the server's business, not the importer's:
+    # tests and tools can import the app without touching the database
+    migrations.startup(engine)
+    create_admin()
+    suggest.load_index()
+    revocation.sync()
+    pruner = asyncio.create_task(revocation.sync_forever())
+    yield
+    pruner.cancel()
+
+app = FastAPI(lifespan=lifespan)
 load_dotenv() 
 app.add_middleware(
     CORSMiddleware,
@@ -21,7 +35,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-create_admin()
 app.include_router(auth.router)
 app.include_router(book.router)
 app.include_router(user.router)
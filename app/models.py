@@ -1,8 +1,11 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, DateTime, Index, and_, or_, text
 from sqlalchemy.dialects.mysql import DATETIME
 from datetime import datetime
 from .database import Base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, synonym, validates
+
+def normalize_email(email):
+    return email.strip().lower() if email is not None else None
 
 class User(Base):
     __tablename__ = 'users'
@@ -10,14 +13,30 @@ class User(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String)
     email = Column(String)
+    # what every lookup filters on; kept in step with email by the validator
+    email_normalized = Column(String, nullable=True, unique=True, index=True)
     password = Column(String)
     role = Column(String, default='user')
     is_varified = Column(Boolean, default=False)
     otp = Column(String, default="")
     otp_expires = Column(DATETIME, default=None)
 
-    borrows = relationship("Borrow", back_populates="user")
-    issued_books = relationship("IssuedBook", back_populates="user")
+    loans = relationship("Loan", back_populates="user")
+
+    @validates("email")
+    def _normalize_email(self, key, email):
+        self.email_normalized = normalize_email(email)
+        return email
+
+# Case-insensitive lookup on email_normalized. The migration leaves it NULL
+# on later case-variants of an address another account already holds; those
+# accounts are still found by their exact address, which wins a tie.
+def by_email(query, email: str):
+    email = email.strip()
+    return query.filter(or_(
+        User.email_normalized == normalize_email(email),
+        and_(User.email_normalized.is_(None), User.email == email),
+    )).order_by(User.email != email, User.id)
 
 class Book(Base):
     __tablename__ = "books"
@@ -25,27 +44,71 @@ class Book(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
     author = Column(String, nullable=False)
-    isbn = Column(String, nullable=True)
+    # normalized by app.core.isbn; NULLs don't collide in a unique index
+    isbn = Column(String, nullable=True, unique=True, index=True)
 
     total_copies = Column(Integer, default=1)
     borrowed_copies = Column(Integer, default=0)
     available_copies = Column(Integer, default=1)
+    # moved by every ORM write, including the counter UPDATEs in
+    # app.core.circulation; the reconciliation job only rechecks books
+    # changed since its last run
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=True)
+
+    loans = relationship("Loan", back_populates="book")
 
-    borrows = relationship("Borrow", back_populates="book")
-    issued_books = relationship("IssuedBook", back_populates="book")
+    __table_args__ = (
+        # serves author-filtered keyset pages on GET /books/
+        Index("ix_books_author_id", "author", "id"),
+        Index("ix_books_updated_at", "updated_at"),
+    )
 
-class Borrow(Base):
-    __tablename__ = "borrows"
+# Circulation channels: self-service borrowing via /books/borrow and
+# desk issuing via /issue/. Both write to the one loans ledger.
+LOAN_CHANNELS = ("borrow", "issue")
+
+class Loan(Base):
+    __tablename__ = "loans"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
-    book_id = Column(Integer, ForeignKey("books.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    book_id = Column(Integer, ForeignKey("books.id"), nullable=False)
+    channel = Column(String, nullable=False)
 
-    borrow_date = Column(DateTime, default=datetime.utcnow)
+    loan_date = Column(DateTime, default=datetime.utcnow)
+    due_date = Column(DateTime, nullable=True)
     return_date = Column(DateTime, nullable=True)
+    fine_cents = Column(Integer, nullable=True)
+
+    # names the borrow and issue APIs have always exposed
+    borrow_date = synonym("loan_date")
+    issue_date = synonym("loan_date")
+
+    user = relationship("User", back_populates="loans")
+    book = relationship("Book", back_populates="loans")
+
+    __table_args__ = (
+        Index("ix_loans_book_id_loan_date", "book_id", "loan_date"),
+        Index("ix_loans_user_id_loan_date", "user_id", "loan_date"),
+        # partial indexes over open loans only: they stay the size of the
+        # desk's working set however large the returned history grows
+        Index("ix_loans_open", "id", sqlite_where=text("return_date IS NULL")),
+        Index("ix_loans_open_user_id", "user_id", sqlite_where=text("return_date IS NULL")),
+        Index("ix_loans_open_book_id", "book_id", sqlite_where=text("return_date IS NULL")),
+        Index("ix_loans_open_due_date", "due_date", sqlite_where=text("return_date IS NULL")),
+        # covers the nightly fines scan so it never visits the table rows
+        Index("ix_loans_due_date", "due_date", "id", "return_date", "user_id", "fine_cents"),
+    )
+
+class ReconciliationRun(Base):
+    __tablename__ = "reconciliation_runs"
 
-    user = relationship("User", back_populates="borrows")
-    book = relationship("Book", back_populates="borrows")
+    id = Column(Integer, primary_key=True, index=True)
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+    full = Column(Boolean, default=False)
+    books_checked = Column(Integer, default=0)
+    books_fixed = Column(Integer, default=0)
 
 class BlacklistedToken(Base):
     __tablename__ = "blacklisted_tokens"
@@ -53,15 +116,7 @@ class BlacklistedToken(Base):
     id = Column(Integer, primary_key=True, index=True)
     token = Column(String, unique=True, nullable=False)
     blacklisted_at = Column(DateTime, default=datetime.utcnow)
-
-class IssuedBook(Base):
-    __tablename__ = "issued_books"
-
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    book_id = Column(Integer, ForeignKey("books.id"), nullable=False)
-    issue_date = Column(DateTime, default=datetime.utcnow)
-    return_date = Column(DateTime, nullable=True)
-
-    user = relationship("User", back_populates="issued_books")
-    book = relationship("Book", back_populates="issued_books")
+    # the token's jti claim (sha256 of the token for pre-jti tokens) and
+    # its exp; rows are pruned once the token would have expired anyway
+    jti = Column(String, nullable=True, unique=True, index=True)
+    expires_at = Column(DateTime, nullable=True, index=True)
@@ -14,32 +14,62 @@
 #
 #     return token.verify_token(data, credentials_exception)
 
+import logging
+import os
+import random
+import time
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
+from .core.cache import TTLCache
+from .core.revocation import revoked_tokens, token_jti
+from .token import ALGORITHM, SECRET_KEY
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
+logger = logging.getLogger(__name__)
+# fraction of authenticated requests that emit a debug record
+AUTH_LOG_SAMPLE_RATE = float(os.getenv("AUTH_LOG_SAMPLE_RATE", "0.01"))
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
-    print("Token received from frontend:", token)
-    # blacklisted = db.query(BlacklistedToken).filter(BlacklistedToken.token == token).first()
-    blacklisted = False
-    if blacklisted :
-        raise HTTPException(status_code=401, detail="Token has been blacklisted")
-    try:
-        payload = jwt.decode(token, "09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7", algorithms=["HS256"])
-
-        email: str = payload.get("sub")
-        role: str = payload.get("role")
-        id: str = payload.get("id")
+# Verified bearer token -> user claims. A hit skips the signature check and
+# claim parsing; entries never outlive the token's own exp.
+claims_cache = TTLCache(
+    maxsize=int(os.getenv("AUTH_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("AUTH_CACHE_TTL_SECONDS", "300")),
+)
 
-        print("Email:", email)
-        print("Role:", role)
-        print("id:", id)
 
-        if email is None or role is None:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token!")
-        return {"email": email, "role": role, "id" : id}
+def _verify(token: str):
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token.")
+
+    email: str = payload.get("sub")
+    role: str = payload.get("role")
+    id: str = payload.get("id")
+    if email is None or role is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token!")
+
+    exp = payload.get("exp")
+    user = {"email": email, "role": role, "id": id, "jti": token_jti(token, payload), "exp": exp}
+    claims_cache.set(token, user, ttl=exp - time.time() if exp is not None else None)
+    return user
+
+
+def get_current_user(token: str = Depends(oauth2_scheme)):
+    user = claims_cache.get(token)
+    cached = user is not None
+    if not cached:
+        user = _verify(token)
+
+    # in-memory set kept in step with blacklisted_tokens; no query per request
+    if user["jti"] in revoked_tokens:
+        raise HTTPException(status_code=401, detail="Token has been blacklisted")
+
+    if AUTH_LOG_SAMPLE_RATE and logger.isEnabledFor(logging.DEBUG) and random.random() < AUTH_LOG_SAMPLE_RATE:
+        logger.debug(
+            "authenticated user_id=%s role=%s cached=%s", user["id"], user["role"], cached,
+            extra={"user_id": user["id"], "role": user["role"], "cached": cached},
+        )
+    return dict(user)
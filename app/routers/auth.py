@@ -1,19 +1,34 @@
 from urllib import request
 
+from typing import Dict
 from fastapi import APIRouter, Depends
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from .. import database, schemas
 from ..controllers import auth
+from ..core import ratelimit
+from ..core.ratelimit import RateLimiter
+from ..core.rbac import role_required
+from ..models import normalize_email
 from ..oauth2 import  get_current_user
 from ..oauth2 import oauth2_scheme
 router = APIRouter(tags=["Authentication"], prefix="/auth")
 
-@router.post('/login')
+# Per-route limits, checked before any hashing or database work. The IP
+# bucket stops one client spraying many accounts; the email bucket stops
+# many clients hammering one account.
+login_by_ip = RateLimiter("login:ip", capacity=20, per_seconds=60)
+login_by_email = RateLimiter("login:email", capacity=5, per_seconds=60)
+signup_by_ip = RateLimiter("signup:ip", capacity=5, per_seconds=60)
+resend_otp_by_ip = RateLimiter("resend-otp:ip", capacity=5, per_seconds=60)
+resend_otp_by_email = RateLimiter("resend-otp:email", capacity=3, per_seconds=300)
+
+@router.post('/login', dependencies=[Depends(login_by_ip.by_client_ip)])
 def login(request: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(database.get_db)):
+    login_by_email.check(normalize_email(request.username))
     return auth.login(request, db)
 
-@router.post('/signup', response_model=schemas.SignupResponse)
+@router.post('/signup', response_model=schemas.SignupResponse, dependencies=[Depends(signup_by_ip.by_client_ip)])
 def signup(request: schemas.UserCreate, db: Session = Depends(database.get_db)):
     print("auth-signup called")
     return auth.signup(request, db)
@@ -22,8 +37,9 @@ def signup(request: schemas.UserCreate, db: Session = Depends(database.get_db)):
 def verify_email(request: schemas.VerifyRequest, db: Session = Depends(database.get_db)):
     return auth.verify_email(request, db)
 
-@router.post('/resend-otp', response_model=schemas.ResendOtpResponse)
+@router.post('/resend-otp', response_model=schemas.ResendOtpResponse, dependencies=[Depends(resend_otp_by_ip.by_client_ip)])
 def resend_otp(request: schemas.ResendOtpRequest, db: Session = Depends(database.get_db)):
+    resend_otp_by_email.check(normalize_email(request.email))
     return auth.resend_otp(request, db)
 @router.post("/change-password")
 def change_password(request: schemas.ChangePasswordRequest, db: Session = Depends(database.get_db), user=Depends(get_current_user)):
@@ -41,3 +57,6 @@ def logout(user = Depends(get_current_user), db: Session = Depends(database.get_
 def me(user=Depends(get_current_user), db: Session = Depends(database.get_db)):
     return auth.get_me(user, db)
 
+@router.get("/rate-limits", response_model=Dict[str, schemas.RateLimitStats])
+def rate_limit_stats(user=Depends(role_required(["admin"]))):
+    return ratelimit.stats()
@@ -1,22 +1,116 @@
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from .. import database, schemas
 from ..controllers import book
+from ..core.cache import book_cache
+from ..core.catalog_io import EXPORT_FORMATS
+from ..core import etag
+from ..core.etag import catalog_version
 from ..core.rbac import role_required  # adjust path if needed
 from ..oauth2 import get_current_user
 router = APIRouter(prefix="/books", tags=["Books"])
 
-@router.get("/", response_model=list[schemas.Book])
-def get_all_books(db: Session = Depends(database.get_db)):
-    return book.get_all_books(db)
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
 
-@router.get("/{book_id}", response_model=schemas.Book)
-def get_book_by_id(book_id: int, db: Session = Depends(database.get_db)):
-    fetched_book = book.get_book(book_id, db)
+# The hot catalog and circulation routes come in two versions: the default
+# threadpool ones on a Session, and `async def` ones on an AsyncSession when
+# ASYNC_ROUTES is set. Both call the same controller logic.
+def _not_modified(request: Request, response: Response, tag: str):
+    if etag.matches(request, tag):
+        return Response(status_code=304, headers={"ETag": tag})
+    response.headers["ETag"] = tag
+
+if database.ASYNC_ROUTES:
+    @router.get("/", response_model=schemas.BookPage)
+    async def get_all_books(
+        request: Request,
+        response: Response,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        after: Optional[int] = Query(None, description="next_cursor of the previous page"),
+        author: Optional[str] = None,
+        available_only: bool = False,
+        db: AsyncSession = Depends(database.get_async_read_db)
+    ):
+        # tag is taken before the query so a concurrent write can only make it older than the data
+        not_modified = _not_modified(request, response, catalog_version.catalog_etag(str(request.query_params)))
+        return not_modified or await book.get_all_books_async(db, limit, after, author, available_only)
+else:
+    @router.get("/", response_model=schemas.BookPage)
+    def get_all_books(
+        request: Request,
+        response: Response,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        after: Optional[int] = Query(None, description="next_cursor of the previous page"),
+        author: Optional[str] = None,
+        available_only: bool = False,
+        db: Session = Depends(database.get_read_db)
+    ):
+        # tag is taken before the query so a concurrent write can only make it older than the data
+        not_modified = _not_modified(request, response, catalog_version.catalog_etag(str(request.query_params)))
+        return not_modified or book.get_all_books(db, limit, after, author, available_only)
+
+@router.get("/search", response_model=schemas.BookSearchPage)
+def search_books(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(database.get_read_db)
+):
+    return book.search_books(q, limit, offset, db)
+
+@router.get("/suggest", response_model=list[schemas.BookSuggestion])
+def suggest_books(
+    prefix: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=50)
+):
+    return book.suggest_books(prefix, limit)
+
+@router.get("/isbn/{isbn}", response_model=schemas.Book)
+def get_book_by_isbn(isbn: str, db: Session = Depends(database.get_read_db)):
+    fetched_book = book.get_book_by_isbn(isbn, db)
     if not fetched_book:
         raise HTTPException(status_code=404, detail="Book not found")
     return fetched_book
 
+@router.post("/lookup", response_model=schemas.IsbnLookupResponse)
+def lookup_books(request: schemas.IsbnLookupRequest, db: Session = Depends(database.get_db)):
+    return book.lookup_books_by_isbn(request.isbns, db)
+
+@router.get("/export")
+def export_books(format: str = "ndjson", db: Session = Depends(database.get_read_db)):
+    chunks = book.export_books(format, db)
+    return StreamingResponse(
+        chunks,
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="books.{format}"'}
+    )
+
+@router.get("/cache/stats", response_model=schemas.CacheStats)
+def book_cache_stats(user=Depends(role_required(["admin"]))):
+    return book_cache.stats()
+
+def _found(fetched_book):
+    if not fetched_book:
+        raise HTTPException(status_code=404, detail="Book not found")
+    return fetched_book
+
+if database.ASYNC_ROUTES:
+    @router.get("/{book_id}", response_model=schemas.Book)
+    async def get_book_by_id(book_id: int, request: Request, response: Response,
+                             db: AsyncSession = Depends(database.get_async_read_db)):
+        not_modified = _not_modified(request, response, catalog_version.book_etag(book_id))
+        return not_modified or _found(await book.get_book_async(book_id, db))
+else:
+    @router.get("/{book_id}", response_model=schemas.Book)
+    def get_book_by_id(book_id: int, request: Request, response: Response, db: Session = Depends(database.get_read_db)):
+        not_modified = _not_modified(request, response, catalog_version.book_etag(book_id))
+        return not_modified or _found(book.get_book(book_id, db))
+
 @router.post("/", response_model=schemas.Book)
 def create_book(
     request: schemas.CreateBookRequest,
@@ -25,6 +119,23 @@ def create_book(
 ):
     return book.create_book(request, db)
 
+@router.post("/import", response_model=schemas.BookImportResult)
+def import_books(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, description="csv or ndjson; guessed from the file name if omitted"),
+    db: Session = Depends(database.get_db),
+    user=Depends(role_required(["admin"]))
+):
+    return book.import_books(file, format, db)
+
+@router.post("/reconcile", response_model=schemas.ReconcileReport)
+def reconcile_counters(
+    full: bool = False,
+    db: Session = Depends(database.get_db),
+    user=Depends(role_required(["admin"]))
+):
+    return book.reconcile_counters(full, db)
+
 @router.put("/{book_id}", response_model=schemas.Book)
 def update_book(
     book_id: int,
@@ -43,22 +154,75 @@ def delete_book(
     book.delete_book(book_id, db)
 
 # Borrow related routes
-@router.post("/borrow", response_model=schemas.BorrowResponse)
-def borrow(
-    request: schemas.BorrowRequest,
-    db: Session = Depends(database.get_db),
-    user=Depends(get_current_user)
-):
-    return book.borrow_book(user, request, db)
+if database.ASYNC_ROUTES:
+    @router.post("/borrow", response_model=schemas.BorrowResponse)
+    async def borrow(
+        request: schemas.BorrowRequest,
+        db: AsyncSession = Depends(database.get_async_db),
+        user=Depends(get_current_user)
+    ):
+        return await book.borrow_book_async(user, request, db)
 
-@router.put("/return/{borrow_id}", response_model=schemas.BorrowResponse)
-def return_book(
-    borrow_id: int,
-    db: Session = Depends(database.get_db),
-    user=Depends(get_current_user)
-):
-    return book.return_book(borrow_id, db, user)
+    @router.post("/borrow/batch", response_model=list[schemas.BorrowResponse])
+    async def borrow_batch(
+        request: schemas.BorrowBatchRequest,
+        db: AsyncSession = Depends(database.get_async_db),
+        user=Depends(get_current_user)
+    ):
+        return await book.borrow_books_batch_async(user, request, db)
+
+    @router.put("/return/{borrow_id}", response_model=schemas.BorrowResponse)
+    async def return_book(
+        borrow_id: int,
+        db: AsyncSession = Depends(database.get_async_db),
+        user=Depends(get_current_user)
+    ):
+        return await book.return_book_async(borrow_id, user, db)
+
+    @router.get("/history/{book_id}", response_model=schemas.BorrowHistoryPage)
+    async def borrow_history(
+        book_id: int,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        channel: Optional[schemas.LoanChannel] = None,
+        db: AsyncSession = Depends(database.get_async_read_db)
+    ):
+        return await book.get_borrow_history_async(book_id, db, limit, cursor, since, until, channel)
+else:
+    @router.post("/borrow", response_model=schemas.BorrowResponse)
+    def borrow(
+        request: schemas.BorrowRequest,
+        db: Session = Depends(database.get_db),
+        user=Depends(get_current_user)
+    ):
+        return book.borrow_book(user, request, db)
+
+    @router.post("/borrow/batch", response_model=list[schemas.BorrowResponse])
+    def borrow_batch(
+        request: schemas.BorrowBatchRequest,
+        db: Session = Depends(database.get_db),
+        user=Depends(get_current_user)
+    ):
+        return book.borrow_books_batch(user, request, db)
+
+    @router.put("/return/{borrow_id}", response_model=schemas.BorrowResponse)
+    def return_book(
+        borrow_id: int,
+        db: Session = Depends(database.get_db),
+        user=Depends(get_current_user)
+    ):
+        return book.return_book(borrow_id, user, db)
 
-@router.get("/history/{book_id}", response_model=list[schemas.BorrowResponse])
-def borrow_history(book_id: int, db: Session = Depends(database.get_db)):
-    return book.get_borrow_history(book_id, db)
\ No newline at end of file
+    @router.get("/history/{book_id}", response_model=schemas.BorrowHistoryPage)
+    def borrow_history(
+        book_id: int,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        channel: Optional[schemas.LoanChannel] = None,
+        db: Session = Depends(database.get_read_db)
+    ):
+        return book.get_borrow_history(book_id, db, limit, cursor, since, until, channel)
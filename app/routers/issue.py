@@ -1,20 +1,74 @@
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from ..schemas import IssueCreate, ReturnBook, IssueResponse, IssuedBookResponse
+from ..schemas import IssueBatchCreate, IssueCreate, ReturnBook, IssueResponse, IssuedBookPage, IssueStatus, LoanChannel, OverduePage
 from ..controllers import issue
-from ..database import get_db
-from typing import List
+from ..database import ASYNC_ROUTES, get_async_db, get_async_read_db, get_db, get_read_db
+from typing import List, Optional
 router = APIRouter(prefix="/issue", tags=["Issue"])
 
-@router.post("/", response_model=IssueResponse, status_code=status.HTTP_201_CREATED)
-def issue_book(data: IssueCreate, db: Session = Depends(get_db)):
-    return issue.issue_book(db, data)
+if ASYNC_ROUTES:
+    @router.post("/", response_model=IssueResponse, status_code=status.HTTP_201_CREATED)
+    async def issue_book(data: IssueCreate, db: AsyncSession = Depends(get_async_db)):
+        return await issue.issue_book_async(db, data)
 
-@router.put("/return/{issue_id}", response_model=IssueResponse)
-def return_book(issue_id: int, db: Session = Depends(get_db)):
-    return issue.return_book(db, issue_id)
+    @router.post("/batch", response_model=List[IssueResponse], status_code=status.HTTP_201_CREATED)
+    async def issue_books_batch(data: IssueBatchCreate, db: AsyncSession = Depends(get_async_db)):
+        return await issue.issue_books_batch_async(db, data)
 
-@router.get("/", response_model=List[IssuedBookResponse])
-def get_all_issued_books(db: Session = Depends(get_db)):
-    return issue.get_all_issued_books(db)
+    @router.put("/return/{issue_id}", response_model=IssueResponse)
+    async def return_book(issue_id: int, db: AsyncSession = Depends(get_async_db)):
+        return await issue.return_book_async(db, issue_id)
 
+    @router.get("/overdue", response_model=OverduePage)
+    async def get_overdue_books(
+        limit: int = Query(50, ge=1, le=500),
+        cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+        db: AsyncSession = Depends(get_async_read_db)
+    ):
+        return await issue.get_overdue_books_async(db, limit, cursor)
+
+    @router.get("/", response_model=IssuedBookPage)
+    async def get_all_issued_books(
+        status: IssueStatus = IssueStatus.active,
+        user_id: Optional[int] = None,
+        book_id: Optional[int] = None,
+        channel: Optional[LoanChannel] = None,
+        limit: int = Query(50, ge=1, le=500),
+        after: Optional[int] = Query(None, description="next_cursor of the previous page"),
+        db: AsyncSession = Depends(get_async_read_db)
+    ):
+        return await issue.get_all_issued_books_async(db, status, limit, after, user_id, book_id, channel)
+
+else:
+    @router.post("/", response_model=IssueResponse, status_code=status.HTTP_201_CREATED)
+    def issue_book(data: IssueCreate, db: Session = Depends(get_db)):
+        return issue.issue_book(db, data)
+
+    @router.post("/batch", response_model=List[IssueResponse], status_code=status.HTTP_201_CREATED)
+    def issue_books_batch(data: IssueBatchCreate, db: Session = Depends(get_db)):
+        return issue.issue_books_batch(db, data)
+
+    @router.put("/return/{issue_id}", response_model=IssueResponse)
+    def return_book(issue_id: int, db: Session = Depends(get_db)):
+        return issue.return_book(db, issue_id)
+
+    @router.get("/overdue", response_model=OverduePage)
+    def get_overdue_books(
+        limit: int = Query(50, ge=1, le=500),
+        cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+        db: Session = Depends(get_read_db)
+    ):
+        return issue.get_overdue_books(db, limit, cursor)
+
+    @router.get("/", response_model=IssuedBookPage)
+    def get_all_issued_books(
+        status: IssueStatus = IssueStatus.active,
+        user_id: Optional[int] = None,
+        book_id: Optional[int] = None,
+        channel: Optional[LoanChannel] = None,
+        limit: int = Query(50, ge=1, le=500),
+        after: Optional[int] = Query(None, description="next_cursor of the previous page"),
+        db: Session = Depends(get_read_db)
+    ):
+        return issue.get_all_issued_books(db, status, limit, after, user_id, book_id, channel)
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List
 from app import database, schemas
@@ -11,22 +12,40 @@ router = APIRouter(
     dependencies=[Depends(role_required(["admin"]))]
 )
 
-# Get all members
-@router.get("/", response_model=List[schemas.UserResponse])
-def get_members(db: Session = Depends(database.get_db)):
-    return member.get_all_members(db)
-
-# Add new member
-@router.post("/", response_model=schemas.UserResponse)
-def add_member(user: schemas.UserCreate, db: Session = Depends(database.get_db)):
-    return member.create_member(user, db)
-
-# Update member
-@router.put("/{member_id}", response_model=schemas.UserResponse)
-def update_member(member_id: int, user: schemas.UserUpdate, db: Session = Depends(database.get_db)):
-    return member.update_member(member_id, user, db)
-
-# Delete member
-@router.delete("/{member_id}")
-def delete_member(member_id: int, db: Session = Depends(database.get_db)):
-    return member.delete_member(member_id, db)
+if database.ASYNC_ROUTES:
+    @router.get("/", response_model=List[schemas.UserResponse])
+    async def get_members(db: AsyncSession = Depends(database.get_async_read_db)):
+        return await member.get_all_members_async(db)
+
+    @router.post("/", response_model=schemas.UserResponse)
+    async def add_member(user: schemas.UserCreate, db: AsyncSession = Depends(database.get_async_db)):
+        return await member.create_member_async(user, db)
+
+    @router.put("/{member_id}", response_model=schemas.UserResponse)
+    async def update_member(member_id: int, user: schemas.UserUpdate, db: AsyncSession = Depends(database.get_async_db)):
+        return await member.update_member_async(member_id, user, db)
+
+    @router.delete("/{member_id}")
+    async def delete_member(member_id: int, db: AsyncSession = Depends(database.get_async_db)):
+        return await member.delete_member_async(member_id, db)
+
+else:
+    # Get all members
+    @router.get("/", response_model=List[schemas.UserResponse])
+    def get_members(db: Session = Depends(database.get_read_db)):
+        return member.get_all_members(db)
+
+    # Add new member
+    @router.post("/", response_model=schemas.UserResponse)
+    def add_member(user: schemas.UserCreate, db: Session = Depends(database.get_db)):
+        return member.create_member(user, db)
+
+    # Update member
+    @router.put("/{member_id}", response_model=schemas.UserResponse)
+    def update_member(member_id: int, user: schemas.UserUpdate, db: Session = Depends(database.get_db)):
+        return member.update_member(member_id, user, db)
+
+    # Delete member
+    @router.delete("/{member_id}")
+    def delete_member(member_id: int, db: Session = Depends(database.get_db)):
+        return member.delete_member(member_id, db)
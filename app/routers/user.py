@@ -9,6 +9,7 @@ router = APIRouter(
 )
 
 get_db = database.get_db
+get_read_db = database.get_read_db
 
 
 # @router.post('/', response_model=schemas.ShowUser)
@@ -17,7 +18,7 @@ get_db = database.get_db
 
 
 @router.get('/{id}', response_model=schemas.UserResponse)
-def get_user(id: int, db: Session = Depends(get_db)):
+def get_user(id: int, db: Session = Depends(get_read_db)):
     return user.show(id, db)
 
 @router.put("/")
@@ -1,4 +1,5 @@
-from typing import List, Optional
+from enum import Enum
+from typing import Dict, List, Optional
 from pydantic import BaseModel, EmailStr, Field
 from typing import Optional
 from datetime import datetime
@@ -71,16 +72,69 @@ class VerifyResponse(BaseModel):
     access_token: str
     token_type: str = "bearer"
 
+class RateLimitStats(BaseModel):
+    allowed: int
+    rejected: int
+    buckets: int
+
 #schemas for books
 class Book(BaseModel):
     id : int
     title: str
     author: str
-    isbn: str
+    isbn: Optional[str] = None
     total_copies: Optional[int] = 0
     borrowed_copies: Optional[int] = 0
     available_copies: Optional[int] = 0
 
+class BookPage(BaseModel):
+    items: List[Book]
+    next_cursor: Optional[int] = None
+
+class BookSearchPage(BaseModel):
+    items: List[Book]
+    next_offset: Optional[int] = None
+
+class BookSuggestion(BaseModel):
+    book_id: int
+    field: str
+    value: str
+
+class IsbnLookupRequest(BaseModel):
+    isbns: List[str]
+
+class IsbnLookupResponse(BaseModel):
+    found: Dict[str, Book]
+    missing: List[str]
+
+class BookImportError(BaseModel):
+    line: int
+    error: str
+
+class BookImportResult(BaseModel):
+    imported: int
+    failed: int
+    errors: List[BookImportError]
+
+class CacheStats(BaseModel):
+    size: int
+    maxsize: int
+    hits: int
+    misses: int
+
+class CounterDrift(BaseModel):
+    book_id: int
+    borrowed_copies: Optional[int] = None
+    available_copies: Optional[int] = None
+    expected_borrowed: int
+    expected_available: int
+
+class ReconcileReport(BaseModel):
+    since: Optional[datetime] = None
+    books_checked: int
+    books_fixed: int
+    drifted: List[CounterDrift]
+
 class BookBase(BaseModel):
     title: str
     author: str
@@ -88,6 +142,8 @@ class BookBase(BaseModel):
     total_copies: int
 
 class BookResponse(BookBase):
+    # imports and the duplicate-ISBN migration can leave a stored book without one
+    isbn: Optional[str] = None
     id: int
     available_copies: int
     borrowed_copies: int
@@ -98,7 +154,7 @@ class BookResponse(BookBase):
 class CreateBookRequest(BaseModel):
     title: Optional[str] = None
     author: Optional[str] = None
-    isbn: Optional[str] = None
+    isbn: str
     total_copies: Optional[int] = None
     borrowed_copies: Optional[int] = None
     available_copies: Optional[int] = None
@@ -111,19 +167,33 @@ class BookUpdateRequest(BaseModel):
     borrowed_copies: Optional[int] = None
     available_copies: Optional[int] = None
 
+class LoanChannel(str, Enum):
+    borrow = "borrow"
+    issue = "issue"
+
 class BorrowRequest(BaseModel):
     book_id: int
 
+class BorrowBatchRequest(BaseModel):
+    book_ids: List[int]
+
 class BorrowResponse(BaseModel):
     id: int
     user_id: int
     book_id: int
+    channel: Optional[str] = None
     borrow_date: datetime
+    due_date: datetime | None = None
     return_date: datetime | None
+    fine_cents: int | None = None
 
     class Config:
         orm_mode = True
 
+class BorrowHistoryPage(BaseModel):
+    items: List[BorrowResponse]
+    next_cursor: Optional[str] = None
+
 ######
 class User(BaseModel):
     id: int
@@ -146,6 +216,10 @@ class IssueCreate(BaseModel):
     user_id: int
     book_id: int
 
+class IssueBatchCreate(BaseModel):
+    user_id: int
+    book_ids: List[int]
+
 class ReturnBook(BaseModel):
     issue_id: int
 
@@ -153,8 +227,11 @@ class IssueResponse(BaseModel):
     id: int
     user: UserResponse
     book: BookResponse
+    channel: Optional[str] = None
     issue_date: datetime
+    due_date: datetime | None = None
     return_date: datetime | None
+    fine_cents: int | None = None
 
     class Config:
         orm_mode = True
@@ -163,8 +240,24 @@ class IssuedBookResponse(BaseModel):
     id: int
     user: UserResponse
     book: BookResponse
+    channel: Optional[str] = None
     issue_date: datetime
+    due_date: datetime | None = None
     return_date: datetime | None
+    fine_cents: int | None = None
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+class IssueStatus(str, Enum):
+    active = "active"
+    returned = "returned"
+    all = "all"
+
+class IssuedBookPage(BaseModel):
+    items: List[IssuedBookResponse]
+    next_cursor: Optional[int] = None
+
+class OverduePage(BaseModel):
+    items: List[IssuedBookResponse]
+    next_cursor: Optional[str] = None
@@ -1,3 +1,4 @@
+import uuid
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from app import schemas
@@ -10,7 +11,7 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 500
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -0,0 +1,144 @@
+"""Sync vs async request path under high concurrency.
+
+Serves the same catalog page and borrow through two small apps, one with
+plain `def` routes on a Session (run on FastAPI's threadpool, 40 threads by
+default) and one with `async def` routes on an AsyncSession over aiosqlite,
+then drives each with many concurrent clients in-process via httpx's ASGI
+transport. Every --write-every'th request is a borrow, the rest are reads of a
+random catalog page. Reports throughput and latency percentiles.
+
+    python -m benchmarks.bench_async_load [--requests 5000] [--concurrency 200] [--books 10000] [--write-every 10] [--pool 20]
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import create_engine, insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import models, schemas
+from app.controllers import book
+from app.database import Base, apply_sqlite_pragmas, async_url, make_engine
+
+USER = {"id": 1, "email": "reader@example.com", "role": "user"}
+
+
+def build(path: str, books: int):
+    engine = make_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(models.User), [{"name": "Reader", "email": USER["email"]}])
+        connection.execute(insert(models.Book), [
+            {"title": f"Book {i}", "author": f"Author {i % 500}", "isbn": f"{i:013d}", "total_copies": 1000,
+             "borrowed_copies": 0, "available_copies": 1000}
+            for i in range(books)
+        ])
+    engine.dispose()
+
+
+# both paths get the same number of connections, so only the request model differs
+def sync_app(url: str, pool: int):
+    engine = create_engine(url, connect_args={"check_same_thread": False}, pool_size=pool, max_overflow=0)
+    apply_sqlite_pragmas(engine)
+    Session_ = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    app = FastAPI()
+
+    # The session is closed inside the route rather than by a yield
+    # dependency: that teardown needs a threadpool thread of its own, and
+    # once every thread is blocked waiting for a connection the ones
+    # holding connections can never give them back.
+    @app.get("/books", response_model=schemas.BookPage)
+    def page(after: int = 0):
+        with Session_() as db:
+            return schemas.BookPage.model_validate(book.get_all_books(db, 20, after), from_attributes=True)
+
+    @app.post("/borrow", response_model=schemas.BorrowResponse)
+    def borrow(request: schemas.BorrowRequest):
+        with Session_() as db:
+            return schemas.BorrowResponse.model_validate(book.borrow_book(USER, request, db), from_attributes=True)
+
+    return app, engine.dispose
+
+
+def async_app(url: str, pool: int):
+    engine = create_async_engine(async_url(url), pool_size=pool, max_overflow=0)
+    apply_sqlite_pragmas(engine.sync_engine)
+    Session_ = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    app = FastAPI()
+
+    async def get_db():
+        async with Session_() as db:
+            yield db
+
+    @app.get("/books", response_model=schemas.BookPage)
+    async def page(after: int = 0, db: AsyncSession = Depends(get_db)):
+        return await book.get_all_books_async(db, 20, after)
+
+    @app.post("/borrow", response_model=schemas.BorrowResponse)
+    async def borrow(request: schemas.BorrowRequest, db: AsyncSession = Depends(get_db)):
+        return await book.borrow_book_async(USER, request, db)
+
+    return app, engine.dispose
+
+
+async def drive(app, requests: int, concurrency: int, books: int, write_every: int):
+    rng = random.Random(0)
+    plan = [
+        ("borrow", rng.randint(1, books)) if write_every and i % write_every == 0 else ("page", rng.randint(0, books))
+        for i in range(requests)
+    ]
+    latencies, errors = [], [0]
+    queue = iter(plan)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app, raise_app_exceptions=False), base_url="http://bench") as client:
+        async def worker():
+            for kind, value in queue:
+                started = time.perf_counter()
+                if kind == "borrow":
+                    res = await client.post("/borrow", json={"book_id": value})
+                else:
+                    res = await client.get("/books", params={"after": value})
+                latencies.append(time.perf_counter() - started)
+                if res.status_code != 200:
+                    errors[0] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    pct = lambda p: round(latencies[int(p * (len(latencies) - 1))] * 1000, 1)
+    return round(requests / elapsed), pct(0.5), pct(0.99), errors[0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--books", type=int, default=10000)
+    parser.add_argument("--write-every", type=int, default=10)
+    parser.add_argument("--pool", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{args.requests} requests, {args.concurrency} concurrent clients, "
+          f"1 in {args.write_every or 'no'} a borrow, {args.books} books, {args.pool} connections")
+    for name, factory in (("sync", sync_app), ("async", async_app)):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.db")
+            build(path, args.books)
+            app, dispose = factory(f"sqlite:///{path}", args.pool)
+            rps, p50, p99, errors = asyncio.run(drive(app, args.requests, args.concurrency, args.books, args.write_every))
+            result = dispose()
+            if asyncio.iscoroutine(result):
+                asyncio.run(result)
+        print(f"{name:>6}: requests/s={rps}, p50={p50}ms, p99={p99}ms, errors={errors}")
+
+
+if __name__ == "__main__":
+    main()
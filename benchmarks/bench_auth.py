@@ -0,0 +1,101 @@
+"""Authenticated request throughput.
+
+Times a bare authenticated route against the old get_current_user (three
+prints and a full jwt.decode per request) and the cached one, both with
+many clients each reusing its own bearer token. Old-style prints go to
+/dev/null so the terminal itself isn't what gets measured.
+
+    python -m benchmarks.bench_auth [--requests 20000] [--users 50] [--threads 8]
+"""
+import argparse
+import contextlib
+import os
+import threading
+import time
+
+from fastapi import Depends, FastAPI, HTTPException, status
+from fastapi.testclient import TestClient
+from jose import JWTError, jwt
+
+from app import oauth2
+from app.token import ALGORITHM, SECRET_KEY, create_access_token
+
+
+def legacy_get_current_user(token: str = Depends(oauth2.oauth2_scheme)):
+    # the implementation the claims cache replaces
+    print("Token received from frontend:", token)
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        email, role, id = payload.get("sub"), payload.get("role"), payload.get("id")
+        print("Email:", email)
+        print("Role:", role)
+        print("id:", id)
+        if email is None or role is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token!")
+        return {"email": email, "role": role, "id": id}
+    except JWTError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token.")
+
+
+def build_app(dependency):
+    app = FastAPI()
+
+    @app.get("/whoami")
+    def whoami(user=Depends(dependency)):
+        return {"id": user["id"]}
+
+    return app
+
+
+def run_dependency(dependency, tokens, requests: int):
+    started = time.perf_counter()
+    for i in range(requests):
+        dependency(tokens[i % len(tokens)])
+    return round(requests / (time.perf_counter() - started))
+
+
+def run_http(dependency, tokens, requests: int, threads: int):
+    client = TestClient(build_app(dependency))
+    per_thread = requests // threads
+
+    def worker(n):
+        for i in range(per_thread):
+            token = tokens[(n + i * threads) % len(tokens)]
+            client.get("/whoami", headers={"Authorization": f"Bearer {token}"})
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return round(per_thread * threads / (time.perf_counter() - started))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    tokens = [
+        create_access_token(data={"sub": f"user{i}@example.com", "role": "user", "id": i})
+        for i in range(args.users)
+    ]
+    print(f"{args.requests} requests, {args.users} distinct tokens, {args.threads} threads")
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        results = []
+        for name, dependency in (("decode + print", legacy_get_current_user), ("claims cache", oauth2.get_current_user)):
+            oauth2.claims_cache.clear()
+            results.append((
+                name,
+                run_dependency(dependency, tokens, args.requests),
+                run_http(dependency, tokens, args.requests // 4, args.threads),
+            ))
+    for name, direct, http in results:
+        print(f"{name:>15}: dependency calls/s={direct}, HTTP requests/s={http}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Many parallel borrowers on one hot title.
+
+Compares the old read-check-write borrow with the single conditional UPDATE
+used by app.core.circulation.reserve_copy, and reports oversold copies and
+throughput for each.
+
+    python -m benchmarks.bench_borrow_concurrency [--threads 32] [--attempts 2000] [--copies 500]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import models, schemas
+from app.controllers import book as book_controller
+from app.database import Base
+
+
+def naive_borrow(user: dict, request: schemas.BorrowRequest, db):
+    # the pre-reservation implementation of controllers.book.borrow_book
+    book = db.query(models.Book).filter(models.Book.id == request.book_id).first()
+    if not book or book.available_copies <= 0:
+        return None
+    book.borrowed_copies += 1
+    book.available_copies -= 1
+    borrow = models.Loan(user_id=user["id"], book_id=request.book_id, channel="borrow")
+    db.add(borrow)
+    db.commit()
+    return borrow
+
+
+def run(borrow, threads: int, attempts: int, copies: int):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False, "timeout": 60})
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+    with Session() as db:
+        hot = models.Book(title="Hot title", author="Bench", total_copies=copies,
+                          available_copies=copies, borrowed_copies=0)
+        db.add(hot)
+        db.commit()
+        book_id = hot.id
+
+    successes = 0
+    errors = 0
+    lock = threading.Lock()
+    per_thread = attempts // threads
+    start_gate = threading.Barrier(threads)
+
+    def worker(n):
+        nonlocal successes, errors
+        start_gate.wait()
+        for _ in range(per_thread):
+            db = Session()
+            try:
+                if borrow({"id": n}, schemas.BorrowRequest(book_id=book_id), db):
+                    with lock:
+                        successes += 1
+            except Exception:
+                db.rollback()
+                with lock:
+                    errors += 1
+            finally:
+                db.close()
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    with Session() as db:
+        final = db.get(models.Book, book_id)
+        loans = db.query(models.Loan).count()
+        available = final.available_copies
+    engine.dispose()
+
+    return {
+        "borrows": successes,
+        "loan rows": loans,
+        "oversold": max(loans - copies, 0) + max(-available, 0),
+        "counter drift": (copies - available) - loans,
+        "errors": errors,
+        "attempts/s": round(per_thread * threads / elapsed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--attempts", type=int, default=2000)
+    parser.add_argument("--copies", type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{args.threads} threads, {args.attempts} borrow attempts, {args.copies} copies")
+    for name, borrow in (("read-check-write", naive_borrow), ("conditional UPDATE", book_controller.borrow_book)):
+        result = run(borrow, args.threads, args.attempts, args.copies)
+        print(f"{name:>20}: " + ", ".join(f"{k}={v}" for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Nightly fine assessment over a large loan ledger.
+
+Builds a throwaway SQLite ledger and times app.core.fines.assess_fines
+against a per-row ORM loop (load Loan objects, compute in Python,
+flush) over the same rows.
+
+    python -m benchmarks.bench_fines [--loans 1000000] [--orm-loans 100000]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.core.fines import FINE_SCHEDULE, assess_fines
+from app.database import Base
+
+
+def build_ledger(path: str, loans: int, now: datetime):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    rng = random.Random(42)
+    with engine.begin() as connection:
+        connection.execute(insert(models.User), [{"name": "Reader", "email": "reader@example.com"}])
+        connection.execute(insert(models.Book), [{"title": "T", "author": "A", "total_copies": loans}])
+        batch = []
+        for i in range(loans):
+            issued = now - timedelta(days=rng.randint(0, 120), seconds=rng.randint(0, 86400))
+            due = issued + timedelta(days=14)
+            returned = None if rng.random() < 0.3 else issued + timedelta(days=rng.randint(1, 60))
+            batch.append({"user_id": 1 + i % 5000, "book_id": 1, "channel": "issue", "loan_date": issued,
+                          "due_date": due, "return_date": returned})
+            if len(batch) == 50000:
+                connection.execute(insert(models.Loan), batch)
+                batch = []
+        if batch:
+            connection.execute(insert(models.Loan), batch)
+    return engine
+
+
+def orm_assess(db, now: datetime, limit: int):
+    # the per-row approach the fines engine replaces
+    last = len(FINE_SCHEDULE) - 1
+    loans = (
+        db.query(models.Loan)
+        .filter(models.Loan.due_date < now)
+        .order_by(models.Loan.id)
+        .limit(limit)
+    )
+    count = 0
+    for loan in loans:
+        end = loan.return_date or now
+        days = max((end - loan.due_date).days, 0)
+        loan.fine_cents = FINE_SCHEDULE[min(days, last)]
+        count += 1
+    db.commit()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--loans", type=int, default=1_000_000)
+    parser.add_argument("--orm-loans", type=int, default=100_000)
+    args = parser.parse_args()
+
+    now = datetime.utcnow()
+    path = os.path.join(tempfile.mkdtemp(), "fines.db")
+    started = time.perf_counter()
+    engine = build_ledger(path, args.loans, now)
+    print(f"built {args.loans} loans in {time.perf_counter() - started:.1f}s")
+    Session = sessionmaker(bind=engine)
+
+    with Session() as db:
+        started = time.perf_counter()
+        report = assess_fines(db, now=now)
+        elapsed = time.perf_counter() - started
+        print(f"assess_fines (first run): {elapsed:.2f}s, {report['loans_assessed'] / elapsed:,.0f} loans/s, {report}")
+
+        started = time.perf_counter()
+        report = assess_fines(db, now=now)
+        elapsed = time.perf_counter() - started
+        print(f"assess_fines (no changes): {elapsed:.2f}s, {report['loans_assessed'] / elapsed:,.0f} loans/s")
+
+    with Session() as db:
+        started = time.perf_counter()
+        count = orm_assess(db, now, args.orm_loans)
+        elapsed = time.perf_counter() - started
+        print(f"per-row ORM loop: {count} loans in {elapsed:.2f}s, {count / elapsed:,.0f} loans/s")
+
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
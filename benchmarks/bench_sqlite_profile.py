@@ -0,0 +1,127 @@
+"""Mixed catalog reads and borrows on SQLite, stock settings vs the WAL profile.
+
+Reader threads fetch random books by id while writer threads borrow and
+return copies through app.core.circulation, each in its own short
+transaction, as the API does. Reports throughput for both sides and read
+latency percentiles, first with SQLite's defaults (rollback journal,
+synchronous=FULL) and then with the profile app.database applies.
+--write-rate paces the writers so both profiles carry the same write load
+and the read numbers compare like for like; 0 lets them run flat out.
+
+    python -m benchmarks.bench_sqlite_profile [--seconds 5] [--readers 8] [--writers 2] [--write-rate 0] [--books 10000]
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.core.circulation import loan_due_date, release_copy, reserve_copy
+from app.database import Base, make_engine
+
+
+def build(path: str, books: int):
+    engine = make_engine(f"sqlite:///{path}", profile="default")
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(models.User), [{"name": "Reader", "email": "reader@example.com"}])
+        connection.execute(insert(models.Book), [
+            {"title": f"Book {i}", "author": f"Author {i % 500}", "total_copies": 1000,
+             "borrowed_copies": 0, "available_copies": 1000}
+            for i in range(books)
+        ])
+    engine.dispose()
+
+
+def run(path: str, profile: str, seconds: float, readers: int, writers: int, books: int, write_rate: float):
+    engine = make_engine(f"sqlite:///{path}", profile=profile)
+    Session = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    stop = threading.Event()
+    latencies, writes, errors = [], [0], [0]
+    lock = threading.Lock()
+
+    def reader(seed):
+        rng = random.Random(seed)
+        mine = []
+        with Session() as db:
+            while not stop.is_set():
+                started = time.perf_counter()
+                db.get(models.Book, rng.randint(1, books), populate_existing=True)
+                db.rollback()
+                mine.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(mine)
+
+    def writer(seed):
+        rng = random.Random(seed)
+        done = failed = 0
+        interval = writers / write_rate if write_rate else 0
+        next_at = time.perf_counter()
+        with Session() as db:
+            while not stop.is_set():
+                if interval:
+                    next_at += interval
+                    time.sleep(max(next_at - time.perf_counter(), 0))
+                book_id = rng.randint(1, books)
+                try:
+                    if reserve_copy(db, book_id):
+                        loan = models.Loan(user_id=1, book_id=book_id, channel="borrow", due_date=loan_due_date())
+                        db.add(loan)
+                        db.commit()
+                        release_copy(db, book_id)
+                        db.commit()
+                        done += 1
+                except OperationalError:
+                    db.rollback()
+                    failed += 1
+        with lock:
+            writes[0] += done
+            errors[0] += failed
+
+    threads = [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+    threads += [threading.Thread(target=writer, args=(1000 + n,)) for n in range(writers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    engine.dispose()
+
+    latencies.sort()
+    pct = lambda p: round(latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000, 2) if latencies else None
+    return {
+        "reads/s": round(len(latencies) / seconds),
+        "borrows/s": round(writes[0] / seconds),
+        "read p50 ms": pct(0.50),
+        "read p99 ms": pct(0.99),
+        "read max ms": pct(1.0),
+        "write errors": errors[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--write-rate", type=float, default=0, help="total borrows per second, 0 for unpaced")
+    parser.add_argument("--books", type=int, default=10000)
+    args = parser.parse_args()
+
+    print(f"{args.readers} readers, {args.writers} writers, {args.books} books, {args.seconds}s per profile")
+    for profile in ("default", "wal"):
+        path = os.path.join(tempfile.mkdtemp(), "bench.db")
+        build(path, args.books)
+        result = run(path, profile, args.seconds, args.readers, args.writers, args.books, args.write_rate)
+        print(f"{profile:>8}: " + ", ".join(f"{k}={v}" for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,29 @@
+import hashlib
 import os
+import threading
+import time
+from datetime import datetime, timedelta
 import pytest
+from unittest.mock import patch
+from jose import jwt
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker
 
-from app.database import Base, get_db
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+from app.database import Base, async_url, get_async_db, get_async_read_db, get_db, get_read_db
 from app.main import app
 from app.core.init_admin import create_admin
+from app.core.cache import TTLCache
+from app.core import ratelimit, revocation
+from app.core.revocation import revoked_tokens
+from app import models
+from app.models import BlacklistedToken
+from app.hashing import pwd_cxt
+from app.oauth2 import claims_cache
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -15,6 +32,9 @@ load_dotenv()
 SQLALCHEMY_TEST_DATABASE_URL = "sqlite:///./test_db.sqlite3"
 engine = create_engine(SQLALCHEMY_TEST_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# NullPool: each TestClient runs its own event loop, so async connections can't be reused across tests
+async_engine = create_async_engine(async_url(SQLALCHEMY_TEST_DATABASE_URL), poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
 
 ADMIN_EMAIL = os.getenv("ADMIN_USERNAME",)
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD")
@@ -42,6 +62,14 @@ def client(db):
         finally:
             db.close()
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as session:
+            yield session
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    app.dependency_overrides[get_async_read_db] = override_get_async_db
+    ratelimit.reset_all()
     return TestClient(app)
 
 # Begin tests using admin only
@@ -132,3 +160,123 @@ def test_signup_fails_if_email_already_registered(client):
 
     assert response.status_code == 400
     assert response.json()["detail"] == "Email already registered"
+
+def test_verified_token_claims_are_cached(client):
+    token = client.post(
+        "/auth/login",
+        data={"username": "admin@example.com", "password": "admin123"}
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    claims_cache.clear()
+
+    with patch("app.oauth2.jwt.decode", wraps=jwt.decode) as decode:
+        assert client.get("/auth/me", headers=headers).status_code == 200
+        assert client.get("/auth/me", headers=headers).status_code == 200
+        assert client.get("/auth/me", headers={"Authorization": "Bearer not-a-token"}).status_code == 401
+        assert client.get("/auth/me", headers={"Authorization": "Bearer not-a-token"}).status_code == 401
+    assert decode.call_count == 3
+
+def test_cache_entry_ttl_is_capped():
+    cache = TTLCache(maxsize=10, ttl=300)
+    cache.set("expired", 1, ttl=-5)
+    cache.set("short", 2, ttl=0.05)
+    cache.set("long", 3, ttl=10_000)
+    assert cache.get("expired") is None
+    assert cache.get("short") == 2
+    time.sleep(0.1)
+    assert cache.get("short") is None
+    assert cache.get("long") == 3
+
+def test_logout_revokes_token_by_jti(client, db):
+    token = client.post(
+        "/auth/login",
+        data={"username": "admin@example.com", "password": "admin123"}
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    assert jwt.get_unverified_claims(token)["jti"]
+
+    assert client.get("/auth/me", headers=headers).status_code == 200
+    assert client.post("/auth/logout", headers=headers).status_code == 200
+    assert client.get("/auth/me", headers=headers).status_code == 401
+
+    # survives a restart: the set is rebuilt from blacklisted_tokens
+    revoked_tokens.clear()
+    assert revocation.load(db) == 1
+    assert client.get("/auth/me", headers=headers).status_code == 401
+
+def test_prune_drops_expired_revocations(db):
+    expired = jwt.encode({"sub": "old@example.com", "exp": datetime.utcnow() - timedelta(minutes=1)}, "k")
+    db.add(BlacklistedToken(token=expired))
+    db.commit()
+
+    assert revocation.load(db) == 0
+    row = db.query(BlacklistedToken).one()
+    assert row.jti == hashlib.sha256(expired.encode()).hexdigest()
+    assert revocation.prune(db) == 1
+    assert db.query(BlacklistedToken).count() == 0
+
+def test_login_sheds_load_when_hash_queue_is_full(client):
+    with patch("app.hashing._slots", threading.BoundedSemaphore(1)) as slots:
+        slots.acquire()
+        response = client.post(
+            "/auth/login",
+            data={"username": "admin@example.com", "password": "admin123"}
+        )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+def test_login_is_rate_limited_per_email(client):
+    for _ in range(5):
+        assert client.post("/auth/login", data={"username": "ghost@example.com", "password": "x"}).status_code == 404
+    response = client.post("/auth/login", data={"username": "Ghost@Example.com ", "password": "x"})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+    # another account from the same client is still let through
+    assert client.post("/auth/login", data={"username": "other@example.com", "password": "x"}).status_code == 404
+    counters = ratelimit.stats()
+    assert counters["login:email"]["rejected"] == 1
+    assert counters["login:ip"]["allowed"] == 7
+
+def test_rate_limiter_refills_and_evicts_idle_buckets():
+    limiter = ratelimit.RateLimiter("test", capacity=2, per_seconds=0.1)
+    limiter.check("a")
+    limiter.check("a")
+    with pytest.raises(HTTPException):
+        limiter.check("a")
+    time.sleep(0.06)
+    limiter.check("a")
+
+    time.sleep(0.15)
+    with patch("app.core.ratelimit.EVICT_INTERVAL_SECONDS", 0):
+        limiter.check("b")
+    assert limiter.stats() == {"allowed": 4, "rejected": 1, "buckets": 1}
+
+def test_email_lookups_ignore_case(client, db):
+    response = client.post("/auth/login", data={"username": " ADMIN@example.com", "password": "admin123"})
+    assert response.status_code == 200
+
+    payload = {"name": "Eve", "email": "Eve@Example.com", "password": "Str0ngP@ssword"}
+    assert client.post("/auth/signup", json=payload).status_code == 200
+    payload["email"] = "eve@example.COM"
+    response = client.post("/auth/signup", json=payload)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Email already registered"
+
+    # the unique index holds even when the pre-check is skipped
+    db.add(models.User(name="Eve", email="EVE@example.com"))
+    with pytest.raises(IntegrityError):
+        db.commit()
+    db.rollback()
+
+def test_case_variant_accounts_left_out_by_migration_can_still_log_in(client, db):
+    # what the email_normalized backfill leaves for a later case-variant duplicate
+    db.execute(text(
+        "INSERT INTO users (name, email, email_normalized, password, role, is_varified) "
+        "VALUES ('Old', 'Admin@Example.com', NULL, :password, 'user', 1)"
+    ), {"password": pwd_cxt.hash("legacy123")})
+    db.commit()
+
+    response = client.post("/auth/login", data={"username": "Admin@Example.com", "password": "legacy123"})
+    assert response.status_code == 200
+    assert client.post("/auth/login", data={"username": "admin@example.com", "password": "admin123"}).status_code == 200
@@ -1,12 +1,25 @@
+import asyncio
+import csv
+import time
+import json
 import os
 import pytest
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker
 from unittest.mock import patch, MagicMock
 from unittest.mock import patch
-from app.database import Base, get_db
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+from app.database import Base, async_url, make_async_engine, make_read_engine, get_async_db, get_async_read_db, get_db, get_read_db
 from app.main import app
+from app import schemas
+from app.controllers import book
+from app.core.cache import book_cache
+from app.core import ratelimit
+from app.core.etag import catalog_version
 from app.core.init_admin import create_admin
 from dotenv import load_dotenv
 
@@ -16,6 +29,9 @@ load_dotenv()
 SQLALCHEMY_TEST_DATABASE_URL = "sqlite:///./test_db.sqlite3"
 engine = create_engine(SQLALCHEMY_TEST_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# NullPool: each TestClient runs its own event loop, so async connections can't be reused across tests
+async_engine = create_async_engine(async_url(SQLALCHEMY_TEST_DATABASE_URL), poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
 
 @pytest.fixture(autouse=True, scope="function")
 def setup_and_teardown_db():
@@ -40,6 +56,14 @@ def client(db):
         finally:
             db.close()
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as session:
+            yield session
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    app.dependency_overrides[get_async_read_db] = override_get_async_db
+    ratelimit.reset_all()
     return TestClient(app)
 
 @pytest.fixture(scope="function")
@@ -71,7 +95,25 @@ def test_create_book(client: TestClient, auth_headers):
 def test_get_all_books(client: TestClient, auth_headers):
     response = client.get("/books", headers=auth_headers)
     assert response.status_code == 200
-    assert isinstance(response.json(), list)
+    assert isinstance(response.json()["items"], list)
+
+def test_get_all_books_paginates_with_cursor(client: TestClient, auth_headers):
+    for i in range(5):
+        client.post("/books", json={"title": f"Book {i}", "author": "Knuth" if i % 2 else "Hopper", "isbn": f"90{i}", "total_copies": 1}, headers=auth_headers)
+
+    first = client.get("/books?limit=2", headers=auth_headers).json()
+    assert [b["title"] for b in first["items"]] == ["Book 0", "Book 1"]
+    assert first["next_cursor"] == first["items"][-1]["id"]
+
+    second = client.get(f"/books?limit=2&after={first['next_cursor']}", headers=auth_headers).json()
+    assert [b["title"] for b in second["items"]] == ["Book 2", "Book 3"]
+
+    last = client.get(f"/books?limit=2&after={second['next_cursor']}", headers=auth_headers).json()
+    assert [b["title"] for b in last["items"]] == ["Book 4"]
+    assert last["next_cursor"] is None
+
+    by_author = client.get("/books?author=Knuth", headers=auth_headers).json()
+    assert [b["title"] for b in by_author["items"]] == ["Book 1", "Book 3"]
 
 def test_get_book_by_id(client: TestClient, auth_headers):
     create = client.post("/books", json={"title": "Django", "author": "Adrian", "isbn": "222", "total_copies": 2}, headers=auth_headers)
@@ -125,8 +167,362 @@ def test_return_book_mocked(mock_return_book, client: TestClient, auth_headers):
 
 # 3. Borrow history
 def test_borrow_history(client: TestClient, auth_headers):
-    books = client.get("/books", headers=auth_headers).json()
+    books = client.get("/books", headers=auth_headers).json()["items"]
     if books:
         book_id = books[0]["id"]
         response = client.get(f"/borrow/history/{book_id}", headers=auth_headers)
-        assert response.status_code in [200, 404]  # it is Acceptable if no history exists`~
\ No newline at end of file
+        assert response.status_code in [200, 404]  # it is Acceptable if no history exists`~
+def test_search_books_ranks_matches(client: TestClient, auth_headers):
+    client.post("/books", json={"title": "Deep Work", "author": "Cal Newport", "isbn": "501", "total_copies": 1}, headers=auth_headers)
+    client.post("/books", json={"title": "Atomic Habits", "author": "James Clear", "isbn": "502", "total_copies": 1}, headers=auth_headers)
+    client.post("/books", json={"title": "The Power of Habit", "author": "Charles Duhigg", "isbn": "503", "total_copies": 1}, headers=auth_headers)
+
+    response = client.get("/books/search?q=habit", headers=auth_headers)
+    assert response.status_code == 200
+    assert {b["title"] for b in response.json()["items"]} == {"Atomic Habits", "The Power of Habit"}
+
+    page = client.get("/books/search?q=habit&limit=1", headers=auth_headers).json()
+    assert len(page["items"]) == 1
+    assert page["next_offset"] == 1
+
+    book_id = client.get("/books/search?q=newport", headers=auth_headers).json()["items"][0]["id"]
+    client.put(f"/books/{book_id}", json={"title": "Shallow Work"}, headers=auth_headers)
+    assert client.get("/books/search?q=deep", headers=auth_headers).json()["items"] == []
+    assert client.get("/books/search?q=shallow", headers=auth_headers).json()["items"][0]["id"] == book_id
+
+    client.delete(f"/books/{book_id}", headers=auth_headers)
+    assert client.get("/books/search?q=newport", headers=auth_headers).json()["items"] == []
+
+def test_suggest_books_follows_catalog_changes(client: TestClient, auth_headers):
+    create = client.post("/books", json={"title": "Zanzibar Chronicles", "author": "Zora Quill", "isbn": "601", "total_copies": 1}, headers=auth_headers)
+    book_id = create.json()["id"]
+
+    response = client.get("/books/suggest?prefix=zanz")
+    assert response.status_code == 200
+    assert {"book_id": book_id, "field": "title", "value": "Zanzibar Chronicles"} in response.json()
+    assert any(s["value"] == "Zanzibar Chronicles" for s in client.get("/books/suggest?prefix=chron").json())
+    assert any(s["field"] == "author" for s in client.get("/books/suggest?prefix=zora q").json())
+
+    client.put(f"/books/{book_id}", json={"title": "Quokka Chronicles"}, headers=auth_headers)
+    assert all(s["book_id"] != book_id for s in client.get("/books/suggest?prefix=zanz").json())
+
+    client.delete(f"/books/{book_id}", headers=auth_headers)
+    assert all(s["book_id"] != book_id for s in client.get("/books/suggest?prefix=quokka").json())
+
+def test_isbn_is_normalized_and_unique(client: TestClient, auth_headers):
+    create = client.post("/books", json={"title": "SICP", "author": "Abelson", "isbn": "0-262-51087-1", "total_copies": 1}, headers=auth_headers)
+    assert create.json()["isbn"] == "9780262510875"
+
+    for isbn in ["0262510871", "978-0-262-51087-5"]:
+        response = client.get(f"/books/isbn/{isbn}", headers=auth_headers)
+        assert response.status_code == 200
+        assert response.json()["title"] == "SICP"
+    assert client.get("/books/isbn/9999999999", headers=auth_headers).status_code == 404
+
+    duplicate = client.post("/books", json={"title": "SICP 2", "author": "Abelson", "isbn": "978 0262510875", "total_copies": 1}, headers=auth_headers)
+    assert duplicate.status_code == 400
+
+def test_lookup_books_by_isbn_batch(client: TestClient, auth_headers):
+    client.post("/books", json={"title": "A", "author": "X", "isbn": "701", "total_copies": 1}, headers=auth_headers)
+    client.post("/books", json={"title": "B", "author": "Y", "isbn": "702", "total_copies": 1}, headers=auth_headers)
+
+    response = client.post("/books/lookup", json={"isbns": ["701", "7-02", "703", "not-an-isbn"]}, headers=auth_headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["found"]["701"]["title"] == "A"
+    assert body["found"]["7-02"]["title"] == "B"
+    assert body["missing"] == ["703", "not-an-isbn"]
+
+def test_import_books_csv_upserts_on_isbn(client: TestClient, auth_headers):
+    client.post("/books", json={"title": "Old Title", "author": "A", "isbn": "801", "total_copies": 2}, headers=auth_headers)
+
+    csv_body = (
+        "title,author,isbn,total_copies\n"
+        "New Title,A,801,5\n"
+        "Fresh,B,802,3\n"
+        ",Missing Title,803,1\n"
+        "Bad Copies,C,804,many\n"
+    )
+    headers = {"Authorization": auth_headers["Authorization"]}
+    response = client.post("/books/import", files={"file": ("catalog.csv", csv_body, "text/csv")}, headers=headers)
+    assert response.status_code == 200
+    report = response.json()
+    assert report["imported"] == 2
+    assert report["failed"] == 2
+    assert [e["line"] for e in report["errors"]] == [4, 5]
+
+    updated = client.get("/books/isbn/801").json()
+    assert updated["title"] == "New Title"
+    assert updated["total_copies"] == 5
+    assert updated["available_copies"] == 5
+    assert client.get("/books/isbn/802").json()["title"] == "Fresh"
+
+def test_import_books_ndjson(client: TestClient, auth_headers):
+    ndjson_body = '{"title": "One", "author": "X", "isbn": "811"}\nnot json\n{"title": "Two", "author": "Y"}\n'
+    headers = {"Authorization": auth_headers["Authorization"]}
+    response = client.post("/books/import?format=ndjson", files={"file": ("catalog.txt", ndjson_body)}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["imported"] == 2
+    assert response.json()["errors"][0]["line"] == 2
+    assert any(s["value"] == "Two" for s in client.get("/books/suggest?prefix=two").json())
+
+def test_import_books_reports_mistyped_rows(client: TestClient, auth_headers):
+    ndjson_body = (
+        '{"title": 5, "author": "x"}\n'
+        '{"title": "Float", "author": "F", "total_copies": 2.7}\n'
+        '{"title": "Whole", "author": "W", "total_copies": 2.0}\n'
+        '{"title": "Numeric", "author": "N", "isbn": 821}\n'
+    ).encode() + b'{"title": "\xff", "author": "Z"}\n{"title": "Last", "author": "L", "total_copies": "4"}\n'
+    headers = {"Authorization": auth_headers["Authorization"]}
+    response = client.post("/books/import?format=ndjson", files={"file": ("catalog.ndjson", ndjson_body)}, headers=headers)
+    assert response.status_code == 200
+    report = response.json()
+    assert report["imported"] == 2
+    assert [(e["line"], e["error"]) for e in report["errors"]] == [
+        (1, "title must be a string"),
+        (2, "total_copies must be an integer"),
+        (4, "isbn must be a string"),
+        (5, "Line is not valid UTF-8"),
+    ]
+    assert [s["value"] for s in client.get("/books/suggest?prefix=whole").json()] == ["Whole"]
+
+def test_import_books_unreadable_csv_returns_partial_report(client: TestClient, auth_headers):
+    csv_body = b"title,author,isbn,total_copies\nKept,K,831,1\nBroken,\xff,832,1\nNever,N,833,1\n"
+    headers = {"Authorization": auth_headers["Authorization"]}
+    response = client.post("/books/import", files={"file": ("catalog.csv", csv_body, "text/csv")}, headers=headers)
+    assert response.status_code == 400
+    assert response.json()["detail"] == {"imported": 1, "failed": 1, "errors": [{"line": 3, "error": "File is not valid UTF-8"}]}
+    assert client.get("/books/isbn/831").json()["title"] == "Kept"
+    assert client.get("/books/isbn/833").status_code == 404
+
+    oversized = b"title,author\nA," + b"B" * (csv.field_size_limit() + 1) + b"\n"
+    response = client.post("/books/import", files={"file": ("catalog.csv", oversized, "text/csv")}, headers=headers)
+    assert response.status_code == 400
+    assert response.json()["detail"]["errors"][0]["error"].startswith("Invalid CSV")
+
+def test_export_books_streams_whole_catalog(client: TestClient, auth_headers):
+    for i in range(3):
+        client.post("/books", json={"title": f"Export {i}", "author": "E", "isbn": f"90{i}", "total_copies": 1}, headers=auth_headers)
+
+    ndjson = client.get("/books/export?format=ndjson")
+    assert ndjson.status_code == 200
+    assert ndjson.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in ndjson.text.splitlines()]
+    assert [b["title"] for b in lines] == ["Export 0", "Export 1", "Export 2"]
+
+    csv_export = client.get("/books/export?format=csv")
+    assert csv_export.status_code == 200
+    rows = csv_export.text.splitlines()
+    assert rows[0].startswith("id,title,author,isbn")
+    assert len(rows) == 4
+
+    assert client.get("/books/export?format=xml").status_code == 400
+
+def test_get_book_is_cached_and_invalidated_on_update(client: TestClient, auth_headers):
+    book_id = client.post("/books", json={"title": "Cached", "author": "C", "isbn": "901", "total_copies": 1}, headers=auth_headers).json()["id"]
+
+    client.get(f"/books/{book_id}")
+    before = client.get("/books/cache/stats", headers=auth_headers).json()
+    assert client.get(f"/books/{book_id}").json()["title"] == "Cached"
+    after = client.get("/books/cache/stats", headers=auth_headers).json()
+    assert after["hits"] == before["hits"] + 1
+
+    client.put(f"/books/{book_id}", json={"title": "Refreshed"}, headers=auth_headers)
+    assert client.get(f"/books/{book_id}").json()["title"] == "Refreshed"
+
+def test_catalog_etags_answer_304_until_book_changes(client: TestClient, auth_headers):
+    book_id = client.post("/books", json={"title": "Tagged", "author": "T", "isbn": "911", "total_copies": 1}, headers=auth_headers).json()["id"]
+
+    first = client.get(f"/books/{book_id}")
+    tag = first.headers["etag"]
+    assert client.get(f"/books/{book_id}", headers={"If-None-Match": tag}).status_code == 304
+
+    listing_tag = client.get("/books?limit=10").headers["etag"]
+    assert client.get("/books?limit=10", headers={"If-None-Match": listing_tag}).status_code == 304
+    assert client.get("/books?limit=5", headers={"If-None-Match": listing_tag}).status_code == 200
+
+    client.put(f"/books/{book_id}", json={"title": "Retagged"}, headers=auth_headers)
+    changed = client.get(f"/books/{book_id}", headers={"If-None-Match": tag})
+    assert changed.status_code == 200
+    assert changed.json()["title"] == "Retagged"
+    assert client.get("/books?limit=10", headers={"If-None-Match": listing_tag}).status_code == 200
+
+def test_catalog_etags_expire_for_writes_made_elsewhere(client: TestClient, auth_headers, db):
+    book_id = client.post("/books", json={"title": "Elsewhere", "author": "E", "isbn": "912", "total_copies": 1}, headers=auth_headers).json()["id"]
+    now = time.time()
+    with patch("app.core.etag.time.time", return_value=now):
+        tag = client.get(f"/books/{book_id}").headers["etag"]
+
+        # another worker or a CLI writes the row; this process's counters never move
+        db.execute(text("UPDATE books SET title = 'Moved' WHERE id = :id"), {"id": book_id})
+        db.commit()
+        assert client.get(f"/books/{book_id}", headers={"If-None-Match": tag}).status_code == 304
+
+    with patch("app.core.etag.time.time", return_value=now + catalog_version.max_age):
+        assert client.get(f"/books/{book_id}", headers={"If-None-Match": tag}).status_code == 200
+
+def test_async_book_controllers_match_the_sync_routes(client: TestClient, auth_headers):
+    # the opt-in ASYNC_ROUTES handlers, driven directly on an AsyncSession
+    book_id = client.post("/books", json={"title": "Async", "author": "Q", "isbn": "931", "total_copies": 2}, headers=auth_headers).json()["id"]
+    user = {"id": 1}
+
+    async def call(controller):
+        # a session per call, as each request gets
+        async with TestingAsyncSessionLocal() as session:
+            return await controller(session)
+
+    async def scenario():
+        borrowed = await call(lambda db: book.borrow_book_async(user, schemas.BorrowRequest(book_id=book_id), db))
+        assert borrowed.channel == "borrow"
+        batch = await call(lambda db: book.borrow_books_batch_async(user, schemas.BorrowBatchRequest(book_ids=[book_id]), db))
+        for missing_id, status in ((book_id, 400), (9999, 404)):
+            with pytest.raises(HTTPException) as refused:
+                await call(lambda db: book.borrow_book_async(user, schemas.BorrowRequest(book_id=missing_id), db))
+            assert refused.value.status_code == status
+        with pytest.raises(HTTPException) as short:
+            await call(lambda db: book.borrow_books_batch_async(user, schemas.BorrowBatchRequest(book_ids=[book_id, 9999]), db))
+        assert short.value.status_code == 404
+
+        returned = await call(lambda db: book.return_book_async(borrowed.id, user, db))
+        assert returned.return_date is not None
+        assert await call(lambda db: book.return_book_async(borrowed.id, user, db)) is None
+
+        history = await call(lambda db: book.get_borrow_history_async(book_id, db, 10))
+        assert [loan.id for loan in history["items"]] == [batch[0].id, borrowed.id]
+        page = await call(lambda db: book.get_all_books_async(db, 10, available_only=True))
+        assert [b.id for b in page["items"]] == [book_id]
+        book_cache.pop(book_id)
+        fetched = await call(lambda db: book.get_book_async(book_id, db))
+        assert (fetched["available_copies"], fetched["borrowed_copies"]) == (1, 1)
+
+    asyncio.run(scenario())
+
+def test_books_without_isbn_are_served(client: TestClient, auth_headers):
+    assert client.post("/books", json={"title": "Untagged", "author": "U", "total_copies": 1}, headers=auth_headers).status_code == 422
+    assert client.post("/books", json={"title": "Untagged", "author": "U", "isbn": " ", "total_copies": 1}, headers=auth_headers).status_code == 400
+
+    # imports and the duplicate-ISBN migration both leave books with no ISBN
+    headers = {"Authorization": auth_headers["Authorization"]}
+    client.post("/books/import?format=ndjson", files={"file": ("catalog.ndjson", '{"title": "Untagged", "author": "U"}\n')}, headers=headers)
+    book_id = client.get("/books/").json()["items"][0]["id"]
+    assert client.get(f"/books/{book_id}").json()["isbn"] is None
+    assert [b["isbn"] for b in client.get("/books/").json()["items"]] == [None]
+
+def test_borrow_stops_at_last_copy(client: TestClient, auth_headers):
+    book_id = client.post("/books", json={"title": "Scarce", "author": "S", "isbn": "921", "total_copies": 2}, headers=auth_headers).json()["id"]
+
+    assert client.post("/books/borrow", json={"book_id": book_id}, headers=auth_headers).status_code == 200
+    assert client.post("/books/borrow", json={"book_id": book_id}, headers=auth_headers).status_code == 200
+    response = client.post("/books/borrow", json={"book_id": book_id}, headers=auth_headers)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "No available copies"
+
+    fetched = client.get(f"/books/{book_id}").json()
+    assert fetched["available_copies"] == 0
+    assert fetched["borrowed_copies"] == 2
+
+    missing = client.post("/books/borrow", json={"book_id": 9999}, headers=auth_headers)
+    assert (missing.status_code, missing.json()["detail"]) == (404, "Book not found")
+
+def test_borrow_batch(client: TestClient, auth_headers):
+    first = client.post("/books", json={"title": "B1", "author": "B", "isbn": "931", "total_copies": 1}, headers=auth_headers).json()["id"]
+    second = client.post("/books", json={"title": "B2", "author": "B", "isbn": "932", "total_copies": 1}, headers=auth_headers).json()["id"]
+
+    response = client.post("/books/borrow/batch", json={"book_ids": [first, second]}, headers=auth_headers)
+    assert response.status_code == 200
+    assert [b["book_id"] for b in response.json()] == [first, second]
+
+    again = client.post("/books/borrow/batch", json={"book_ids": [first, second]}, headers=auth_headers)
+    assert again.status_code == 400
+    assert client.get(f"/books/{first}").json()["borrowed_copies"] == 1
+
+def test_borrow_history_is_paginated_newest_first(client: TestClient, auth_headers):
+    book_id = client.post("/books", json={"title": "Popular", "author": "P", "isbn": "941", "total_copies": 5}, headers=auth_headers).json()["id"]
+    borrow_ids = [
+        client.post("/books/borrow", json={"book_id": book_id}, headers=auth_headers).json()["id"]
+        for _ in range(3)
+    ]
+
+    first = client.get(f"/books/history/{book_id}?limit=2").json()
+    assert [b["id"] for b in first["items"]] == borrow_ids[::-1][:2]
+    assert first["next_cursor"]
+
+    second = client.get(f"/books/history/{book_id}?limit=2&cursor={first['next_cursor']}").json()
+    assert [b["id"] for b in second["items"]] == [borrow_ids[0]]
+    assert second["next_cursor"] is None
+
+    assert client.get(f"/books/history/{book_id}?since=2999-01-01T00:00:00").json()["items"] == []
+    assert client.get(f"/books/history/{book_id}?cursor=garbage").status_code == 400
+
+def test_reconcile_fixes_drifted_counters(client: TestClient, auth_headers, db):
+    drifted = client.post("/books", json={"title": "D1", "author": "D", "isbn": "951", "total_copies": 3}, headers=auth_headers).json()["id"]
+    steady = client.post("/books", json={"title": "D2", "author": "D", "isbn": "952", "total_copies": 2}, headers=auth_headers).json()["id"]
+    client.post("/books/borrow", json={"book_id": drifted}, headers=auth_headers)
+    client.post("/books/borrow", json={"book_id": steady}, headers=auth_headers)
+    # a raw write that skips updated_at, like the old hand-kept counters
+    db.execute(text("UPDATE books SET borrowed_copies = 0, available_copies = 3 WHERE id = :id"), {"id": drifted})
+    db.commit()
+
+    assert client.post("/books/reconcile").status_code == 401
+    report = client.post("/books/reconcile", headers=auth_headers).json()
+    assert report["since"] is None
+    assert report["books_checked"] == 2
+    assert report["books_fixed"] == 1
+    assert report["drifted"] == [{"book_id": drifted, "borrowed_copies": 0, "available_copies": 3,
+                                  "expected_borrowed": 1, "expected_available": 2}]
+    fetched = client.get(f"/books/{drifted}").json()
+    assert (fetched["borrowed_copies"], fetched["available_copies"]) == (1, 2)
+
+    # incremental runs only look at books written since the previous run
+    db.execute(text("UPDATE books SET available_copies = 9 WHERE id = :id"), {"id": steady})
+    db.commit()
+    quiet = client.post("/books/reconcile", headers=auth_headers).json()
+    assert quiet["since"] is not None
+    assert (quiet["books_checked"], quiet["books_fixed"]) == (0, 0)
+
+    client.post("/books/borrow", json={"book_id": steady}, headers=auth_headers)
+    report = client.post("/books/reconcile", headers=auth_headers).json()
+    assert report["books_checked"] == 1
+    assert report["drifted"][0]["expected_available"] == 0
+    assert client.get(f"/books/{steady}").json()["available_copies"] == 0
+
+def test_reconcile_keeps_available_clamped_at_zero(client: TestClient, auth_headers, db):
+    book_id = client.post("/books", json={"title": "S1", "author": "S", "isbn": "961", "total_copies": 2}, headers=auth_headers).json()["id"]
+    client.post("/books/borrow", json={"book_id": book_id}, headers=auth_headers)
+    client.post("/books/borrow", json={"book_id": book_id}, headers=auth_headers)
+    # shrunk below the copies on loan: update_book stops available_copies at 0
+    client.put(f"/books/{book_id}", json={"total_copies": 1}, headers=auth_headers)
+
+    report = client.post("/books/reconcile?full=true", headers=auth_headers).json()
+    assert (report["books_fixed"], report["drifted"]) == (0, [])
+    fetched = client.get(f"/books/{book_id}").json()
+    assert (fetched["borrowed_copies"], fetched["available_copies"]) == (2, 0)
+
+    db.execute(text("UPDATE books SET available_copies = -1 WHERE id = :id"), {"id": book_id})
+    db.commit()
+    report = client.post("/books/reconcile?full=true", headers=auth_headers).json()
+    assert report["drifted"][0]["expected_available"] == 0
+    assert client.get(f"/books/{book_id}").json()["available_copies"] == 0
+
+def test_read_sessions_are_query_only():
+    read_engine = make_read_engine(SQLALCHEMY_TEST_DATABASE_URL)
+    read_db = sessionmaker(bind=read_engine)()
+    try:
+        assert read_db.execute(text("PRAGMA query_only")).scalar() == 1
+        read_db.execute(text("SELECT count(*) FROM books")).scalar()
+        with pytest.raises(OperationalError):
+            read_db.execute(text("UPDATE books SET title = title"))
+    finally:
+        read_db.close()
+        read_engine.dispose()
+
+def test_async_read_sessions_are_query_only():
+    async def probe():
+        read_engine = make_async_engine(async_url(SQLALCHEMY_TEST_DATABASE_URL), read_only=True)
+        async with async_sessionmaker(bind=read_engine)() as read_db:
+            assert (await read_db.execute(text("PRAGMA query_only"))).scalar() == 1
+            with pytest.raises(OperationalError):
+                await read_db.execute(text("UPDATE books SET title = title"))
+        await read_engine.dispose()
+
+    asyncio.run(probe())
@@ -0,0 +1,296 @@
+import asyncio
+import pytest
+from array import array
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+from app.database import Base, async_url, get_async_db, get_async_read_db, get_db, get_read_db
+from app.main import app
+from app.core import ratelimit
+from app.core.init_admin import create_admin
+from app.core.circulation import LOAN_PERIOD_DAYS, sweep_overdue
+from app.core.schema import migrate_legacy_loans
+from app.core.fines import FINE_CAP_CENTS, FINE_SCHEDULE, assess_fines, compute_fines, fine_schedule
+from app.controllers import issue, member
+from app.models import Loan
+from app.schemas import IssueBatchCreate, IssueCreate, IssueStatus, UserCreate
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# initial test DB setup
+SQLALCHEMY_TEST_DATABASE_URL = "sqlite:///./test_db.sqlite3"
+engine = create_engine(SQLALCHEMY_TEST_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# NullPool: each TestClient runs its own event loop, so async connections can't be reused across tests
+async_engine = create_async_engine(async_url(SQLALCHEMY_TEST_DATABASE_URL), poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+@pytest.fixture(autouse=True, scope="function")
+def setup_and_teardown_db():
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture(scope="function")
+def db():
+    db = TestingSessionLocal()
+    try:
+        create_admin(db)
+        yield db
+    finally:
+        db.close()
+
+@pytest.fixture(scope="function")
+def client(db):
+    def override_get_db():
+        try:
+            yield db
+        finally:
+            db.close()
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as session:
+            yield session
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    app.dependency_overrides[get_async_read_db] = override_get_async_db
+    ratelimit.reset_all()
+    return TestClient(app)
+
+@pytest.fixture(scope="function")
+def auth_headers(client):
+    res = client.post(
+        "/auth/login",
+        data={"username": 'admin@example.com', "password": "admin123"}
+    )
+    return {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+@pytest.fixture(scope="function")
+def member_id(client, auth_headers):
+    res = client.post("/members/", json={"name": "Reader", "email": "reader@example.com"}, headers=auth_headers)
+    return res.json()["id"]
+
+def create_book(client, auth_headers, title, copies):
+    res = client.post("/books/", json={"title": title, "author": "A", "isbn": title, "total_copies": copies}, headers=auth_headers)
+    return res.json()["id"]
+
+# Issue tests
+
+def test_issue_and_return_book(client: TestClient, auth_headers, member_id):
+    book_id = create_book(client, auth_headers, "101", 1)
+
+    issued = client.post("/issue/", json={"user_id": member_id, "book_id": book_id})
+    assert issued.status_code == 201
+    assert issued.json()["book"]["available_copies"] == 0
+
+    assert client.post("/issue/", json={"user_id": member_id, "book_id": book_id}).status_code == 400
+
+    returned = client.put(f"/issue/return/{issued.json()['id']}")
+    assert returned.status_code == 200
+    assert returned.json()["return_date"] is not None
+    assert returned.json()["book"]["available_copies"] == 1
+    assert client.put(f"/issue/return/{issued.json()['id']}").status_code == 400
+
+def test_issue_batch_takes_all_books(client: TestClient, auth_headers, member_id):
+    first = create_book(client, auth_headers, "201", 2)
+    second = create_book(client, auth_headers, "202", 1)
+
+    response = client.post("/issue/batch", json={"user_id": member_id, "book_ids": [first, second, first]})
+    assert response.status_code == 201
+    assert [i["book"]["id"] for i in response.json()] == [first, second, first]
+    assert client.get(f"/books/{first}").json()["available_copies"] == 0
+    assert client.get(f"/books/{second}").json()["available_copies"] == 0
+
+def test_issue_batch_is_all_or_nothing(client: TestClient, auth_headers, member_id):
+    plenty = create_book(client, auth_headers, "301", 5)
+    scarce = create_book(client, auth_headers, "302", 1)
+
+    response = client.post("/issue/batch", json={"user_id": member_id, "book_ids": [plenty, scarce, scarce]})
+    assert response.status_code == 400
+    assert str(scarce) in response.json()["detail"]
+    assert client.get(f"/books/{plenty}").json()["available_copies"] == 5
+    assert client.get(f"/books/{scarce}").json()["available_copies"] == 1
+
+    missing = client.post("/issue/batch", json={"user_id": member_id, "book_ids": [plenty, 9999]})
+    assert missing.status_code == 404
+    assert client.post("/issue/batch", json={"user_id": 9999, "book_ids": [plenty]}).status_code == 404
+
+def test_list_issued_books_filters_by_status(client: TestClient, auth_headers, member_id):
+    book_id = create_book(client, auth_headers, "401", 5)
+    other_book = create_book(client, auth_headers, "402", 5)
+    issue_ids = [client.post("/issue/", json={"user_id": member_id, "book_id": book_id}).json()["id"] for _ in range(3)]
+    other_issue = client.post("/issue/", json={"user_id": member_id, "book_id": other_book}).json()["id"]
+    client.put(f"/issue/return/{issue_ids[0]}")
+
+    active = client.get("/issue/").json()
+    assert [i["id"] for i in active["items"]] == issue_ids[1:] + [other_issue]
+
+    returned = client.get("/issue/?status=returned").json()
+    assert [i["id"] for i in returned["items"]] == issue_ids[:1]
+
+    everything = client.get(f"/issue/?status=all&book_id={book_id}&limit=2").json()
+    assert [i["id"] for i in everything["items"]] == issue_ids[:2]
+    rest = client.get(f"/issue/?status=all&book_id={book_id}&limit=2&after={everything['next_cursor']}").json()
+    assert [i["id"] for i in rest["items"]] == issue_ids[2:]
+    assert rest["next_cursor"] is None
+
+    assert client.get("/issue/?user_id=9999").json()["items"] == []
+    assert client.get("/issue/?status=lost").status_code == 422
+
+def test_borrow_and_issue_share_one_ledger(client: TestClient, auth_headers, member_id):
+    book_id = create_book(client, auth_headers, "451", 3)
+    issued = client.post("/issue/", json={"user_id": member_id, "book_id": book_id}).json()
+    borrowed = client.post("/books/borrow", json={"book_id": book_id}, headers=auth_headers).json()
+    assert issued["channel"] == "issue"
+    assert borrowed["channel"] == "borrow"
+
+    book = client.get(f"/books/{book_id}").json()
+    assert (book["available_copies"], book["borrowed_copies"]) == (1, 2)
+
+    loans = client.get(f"/issue/?book_id={book_id}").json()["items"]
+    assert [i["id"] for i in loans] == [issued["id"], borrowed["id"]]
+    desk = client.get(f"/issue/?book_id={book_id}&channel=issue").json()["items"]
+    assert [i["id"] for i in desk] == [issued["id"]]
+
+    history = client.get(f"/books/history/{book_id}").json()["items"]
+    assert {i["channel"] for i in history} == {"borrow", "issue"}
+
+    client.put(f"/issue/return/{issued['id']}")
+    book = client.get(f"/books/{book_id}").json()
+    assert (book["available_copies"], book["borrowed_copies"]) == (2, 1)
+
+def test_books_and_members_with_loans_cannot_be_deleted(client: TestClient, auth_headers, member_id):
+    book_id = create_book(client, auth_headers, "461", 1)
+    issued = client.post("/issue/", json={"user_id": member_id, "book_id": book_id}).json()
+    client.put(f"/issue/return/{issued['id']}")
+
+    # returned loans are still history the ledger has to keep
+    book_delete = client.delete(f"/books/{book_id}", headers=auth_headers)
+    assert book_delete.status_code == 409
+    member_delete = client.delete(f"/members/{member_id}", headers=auth_headers)
+    assert member_delete.status_code == 409
+    assert client.get(f"/books/{book_id}").status_code == 200
+    assert client.get(f"/issue/?status=all&book_id={book_id}").json()["items"][0]["id"] == issued["id"]
+
+    idle = client.post("/members/", json={"name": "Idle", "email": "idle@example.com"}, headers=auth_headers).json()["id"]
+    assert client.delete(f"/members/{idle}", headers=auth_headers).status_code == 200
+
+def test_async_controllers_match_the_sync_routes(client: TestClient, auth_headers, member_id):
+    # the opt-in ASYNC_ROUTES handlers, driven directly on an AsyncSession
+    book_id = create_book(client, auth_headers, "471", 2)
+    other = create_book(client, auth_headers, "472", 1)
+
+    async def call(controller):
+        # a session per call, as each request gets
+        async with TestingAsyncSessionLocal() as session:
+            return await controller(session)
+
+    async def scenario():
+        issued = await call(lambda db: issue.issue_book_async(db, IssueCreate(user_id=member_id, book_id=book_id)))
+        assert (issued.channel, issued.book.available_copies) == ("issue", 1)
+        batch = await call(lambda db: issue.issue_books_batch_async(db, IssueBatchCreate(user_id=member_id, book_ids=[book_id, other])))
+        assert [loan.book_id for loan in batch] == [book_id, other]
+        with pytest.raises(HTTPException) as short:
+            await call(lambda db: issue.issue_book_async(db, IssueCreate(user_id=member_id, book_id=other)))
+        assert short.value.status_code == 400
+
+        returned = await call(lambda db: issue.return_book_async(db, issued.id))
+        assert returned.return_date is not None and returned.book.available_copies == 1
+        page = await call(lambda db: issue.get_all_issued_books_async(db, IssueStatus.active, 10))
+        assert [loan.id for loan in page["items"]] == [loan.id for loan in batch]
+        assert (await call(lambda db: issue.get_overdue_books_async(db, 10)))["items"] == []
+
+        idle = await call(lambda db: member.create_member_async(UserCreate(name="Idle", email="Idle@example.com", password="x"), db))
+        with pytest.raises(HTTPException) as kept:
+            await call(lambda db: member.delete_member_async(member_id, db))
+        assert kept.value.status_code == 409
+        assert (await call(lambda db: member.delete_member_async(idle.id, db)))["detail"] == "Member deleted"
+        assert idle.id not in [user.id for user in await call(lambda db: member.get_all_members_async(db))]
+
+    asyncio.run(scenario())
+
+def test_migrate_legacy_loans(tmp_path):
+    legacy = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with legacy.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE issued_books (id INTEGER PRIMARY KEY, user_id INTEGER, "
+                                   "book_id INTEGER, issue_date DATETIME, return_date DATETIME)")
+        connection.exec_driver_sql("CREATE TABLE borrows (id INTEGER PRIMARY KEY, user_id INTEGER, "
+                                   "book_id INTEGER, borrow_date DATETIME, return_date DATETIME)")
+        connection.exec_driver_sql("INSERT INTO issued_books VALUES (7, 1, 1, '2025-01-01 00:00:00.000000', NULL)")
+        connection.exec_driver_sql("INSERT INTO borrows VALUES (1, 1, 1, '2025-01-02 00:00:00.000000', NULL)")
+    Base.metadata.create_all(legacy)
+    with legacy.begin() as connection:
+        connection.exec_driver_sql("INSERT INTO books (id, title, author, total_copies, borrowed_copies, "
+                                   "available_copies) VALUES (1, 'T', 'A', 5, 1, 3)")
+
+    for _ in range(2):
+        with legacy.begin() as connection:
+            migrate_legacy_loans(connection)
+
+    with sessionmaker(bind=legacy)() as session:
+        loans = session.query(Loan).order_by(Loan.id).all()
+        assert [(l.id, l.channel) for l in loans] == [(7, "issue"), (8, "borrow")]
+        assert loans[0].due_date == loans[0].loan_date + timedelta(days=LOAN_PERIOD_DAYS)
+        assert session.execute(text("SELECT borrowed_copies FROM books")).scalar() == 2
+    legacy.dispose()
+
+def test_overdue_report_and_sweep(client: TestClient, auth_headers, member_id, db):
+    book_id = create_book(client, auth_headers, "501", 5)
+    late = client.post("/issue/", json={"user_id": member_id, "book_id": book_id}).json()
+    later = client.post("/issue/", json={"user_id": member_id, "book_id": book_id}).json()
+    on_time = client.post("/issue/", json={"user_id": member_id, "book_id": book_id}).json()
+    returned = client.post("/issue/", json={"user_id": member_id, "book_id": book_id}).json()
+    assert late["due_date"] is not None
+
+    now = datetime.utcnow()
+    for issue_id, due in ((late["id"], now - timedelta(days=9)), (later["id"], now - timedelta(days=2)),
+                          (returned["id"], now - timedelta(days=5))):
+        db.query(Loan).filter(Loan.id == issue_id).update({Loan.due_date: due})
+    db.commit()
+    client.put(f"/issue/return/{returned['id']}")
+
+    page = client.get("/issue/overdue?limit=1").json()
+    assert [i["id"] for i in page["items"]] == [late["id"]]
+    rest = client.get(f"/issue/overdue?limit=1&cursor={page['next_cursor']}").json()
+    assert [i["id"] for i in rest["items"]] == [later["id"]]
+    assert on_time["id"] not in [i["id"] for i in rest["items"]]
+
+    seen = []
+    report = sweep_overdue(db, handler=lambda rows: seen.extend(r.id for r in rows), chunk_size=1)
+    assert report == {"issue": 2}
+    assert seen == [late["id"], later["id"]]
+
+def test_fine_schedule_is_tiered_and_capped():
+    schedule = fine_schedule(tiers=((2, 10), (2, 20), (None, 50)), cap=100)
+    assert schedule == [0, 10, 20, 40, 60, 100]
+    assert compute_fines(array("d", [10.0, 10.0, 10.0]), array("d", [9.0, 13.5, 400.0]), schedule) == [0, 40, 100]
+
+def test_assess_fines_writes_back_changed_fines(client: TestClient, auth_headers, member_id, db):
+    book_id = create_book(client, auth_headers, "601", 5)
+    open_loan = client.post("/issue/", json={"user_id": member_id, "book_id": book_id}).json()["id"]
+    returned_late = client.post("/issue/", json={"user_id": member_id, "book_id": book_id}).json()["id"]
+    on_time = client.post("/issue/", json={"user_id": member_id, "book_id": book_id}).json()["id"]
+    client.put(f"/issue/return/{returned_late}")
+
+    now = datetime.utcnow()
+    db.query(Loan).filter(Loan.id == open_loan).update({Loan.due_date: now - timedelta(days=3, hours=1)})
+    db.query(Loan).filter(Loan.id == returned_late).update({Loan.due_date: now - timedelta(days=400)})
+    db.commit()
+
+    report = assess_fines(db, now=now)
+    assert report["loans_assessed"] == 2
+    assert report["fines_updated"] == 2
+    assert report["users_fined"] == 1
+
+    fines = dict(db.query(Loan.id, Loan.fine_cents))
+    assert fines[open_loan] == FINE_SCHEDULE[3]
+    assert fines[returned_late] == FINE_CAP_CENTS
+    assert fines[on_time] is None
+
+    assert assess_fines(db, now=now)["fines_updated"] == 0
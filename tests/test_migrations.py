@@ -0,0 +1,110 @@
+import pytest
+from sqlalchemy import create_engine, inspect
+from unittest.mock import patch
+
+from app.core import catalog_io, migrations
+from app.database import Base
+
+
+def _schema(engine):
+    inspector = inspect(engine)
+    return {
+        table: (
+            {column["name"] for column in inspector.get_columns(table)},
+            {index["name"]: (tuple(index["column_names"]), bool(index["unique"])) for index in inspector.get_indexes(table)},
+        )
+        for table in Base.metadata.tables
+    }
+
+
+def test_upgrade_applies_each_migration_once(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    assert [version for version, _ in migrations.pending(engine)] == [m[0] for m in migrations.MIGRATIONS]
+
+    assert migrations.upgrade(engine) == [m[0] for m in migrations.MIGRATIONS]
+    assert migrations.upgrade(engine) == []
+    assert migrations.pending(engine) == []
+    assert all(applied_at for _, _, applied_at in migrations.status(engine))
+
+    indexes = {index["name"] for index in inspect(engine).get_indexes("users")}
+    assert "ix_users_email_normalized" in indexes
+    engine.dispose()
+
+
+def test_migrated_schema_matches_the_models(tmp_path):
+    # the migrations carry their own DDL; a model change without a new migration fails here
+    models = create_engine(f"sqlite:///{tmp_path / 'models.db'}")
+    Base.metadata.create_all(models)
+    fresh = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    migrations.upgrade(fresh)
+    legacy = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with legacy.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE users (id INTEGER PRIMARY KEY, name VARCHAR, email VARCHAR, "
+                                   "password VARCHAR, role VARCHAR, is_varified BOOLEAN, otp VARCHAR, otp_expires DATETIME)")
+        connection.exec_driver_sql("CREATE TABLE books (id INTEGER PRIMARY KEY, title VARCHAR NOT NULL, author VARCHAR NOT NULL, "
+                                   "isbn VARCHAR, total_copies INTEGER, borrowed_copies INTEGER, available_copies INTEGER)")
+        connection.exec_driver_sql("CREATE TABLE blacklisted_tokens (id INTEGER PRIMARY KEY, token VARCHAR NOT NULL UNIQUE, "
+                                   "blacklisted_at DATETIME)")
+    migrations.upgrade(legacy)
+
+    expected = _schema(models)
+    assert _schema(fresh) == expected
+    assert _schema(legacy) == expected
+    for engine in (models, fresh, legacy):
+        engine.dispose()
+
+
+def test_legacy_database_is_upgraded_in_place(tmp_path, caplog):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE users (id INTEGER PRIMARY KEY, name VARCHAR, email VARCHAR, "
+                                   "password VARCHAR, role VARCHAR, is_varified BOOLEAN, otp VARCHAR, otp_expires DATETIME)")
+        connection.exec_driver_sql("CREATE TABLE books (id INTEGER PRIMARY KEY, title VARCHAR NOT NULL, author VARCHAR NOT NULL, "
+                                   "isbn VARCHAR, total_copies INTEGER, borrowed_copies INTEGER, available_copies INTEGER)")
+        connection.exec_driver_sql("INSERT INTO users (id, email) VALUES (1, 'Ann@Example.com'), (2, 'ann@example.com')")
+        connection.exec_driver_sql("INSERT INTO books (id, title, author, isbn) VALUES (1, 'A', 'X', '1'), (2, 'B', 'Y', '1')")
+
+    with caplog.at_level("WARNING"):
+        migrations.upgrade(engine)
+    assert "Users [2] share an address with an older account" in caplog.text
+    assert "Moved duplicate ISBNs of books {2: '1'} to books_duplicate_isbns" in caplog.text
+    with engine.connect() as connection:
+        emails = connection.exec_driver_sql("SELECT id, email_normalized FROM users ORDER BY id").all()
+        assert emails == [(1, "ann@example.com"), (2, None)]
+        # the later duplicate ISBN is set aside so the import's upsert has its unique index
+        assert connection.exec_driver_sql("SELECT id, isbn FROM books ORDER BY id").all() == [(1, "1"), (2, None)]
+        assert connection.exec_driver_sql("SELECT book_id, isbn FROM books_duplicate_isbns").all() == [(2, "1")]
+        isbn_index = {index["name"]: index for index in inspect(connection).get_indexes("books")}["ix_books_isbn"]
+        assert isbn_index["unique"]
+        connection.execute(catalog_io._UPSERT_SQL, {"title": "A2", "author": "X", "isbn": "1", "total_copies": 2})
+        assert connection.exec_driver_sql("SELECT title FROM books WHERE id = 1").scalar() == "A2"
+        assert connection.exec_driver_sql("SELECT rowid FROM books_fts WHERE books_fts MATCH 'B'").all() == [(2,)]
+    engine.dispose()
+
+
+def test_startup_refuses_pending_migrations_without_auto_migrate(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'manual.db'}")
+    with patch("app.core.migrations.AUTO_MIGRATE", False):
+        with pytest.raises(RuntimeError, match="app.core.migrations upgrade"):
+            migrations.startup(engine)
+        migrations.upgrade(engine)
+        migrations.startup(engine)
+    engine.dispose()
+
+
+def test_stored_isbns_are_normalized_before_indexing(tmp_path, caplog):
+    engine = create_engine(f"sqlite:///{tmp_path / 'isbns.db'}")
+    with engine.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE books (id INTEGER PRIMARY KEY, title VARCHAR NOT NULL, author VARCHAR NOT NULL, "
+                                   "isbn VARCHAR, total_copies INTEGER, borrowed_copies INTEGER, available_copies INTEGER)")
+        connection.exec_driver_sql("INSERT INTO books (id, title, author, isbn) VALUES "
+                                   "(1, 'A', 'X', '0-262-51087-1'), (2, 'B', 'Y', '978 0262510875'), (3, 'C', 'Z', 'n/a')")
+
+    with caplog.at_level("WARNING", logger="app.core.schema"):
+        migrations.upgrade(engine)
+    with engine.connect() as connection:
+        isbns = connection.exec_driver_sql("SELECT id, isbn FROM books ORDER BY id").all()
+    assert isbns == [(1, "9780262510875"), (2, "978 0262510875"), (3, "n/a")]
+    assert "Books [2] have the same ISBN 9780262510875 as book 1" in caplog.text
+    assert "Book 3 has an invalid ISBN 'n/a'" in caplog.text
+    engine.dispose()